@@ -0,0 +1,73 @@
+"""
+Build optimized artifacts for the Sales Prediction Chatbot
+Run this once after updating the sales CSV or the model
+"""
+
+import os
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from predict import DATA_DTYPES, FEATURE_COLUMNS, PREDICTOR_LIB
+
+# Get the directory where this script is located
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CSV_PATH = os.path.join(SCRIPT_DIR, 'sales_data_with_mapped_ids_v3.csv')
+PARQUET_PATH = os.path.join(SCRIPT_DIR, 'sales_data_v3.parquet')
+MODEL_PATH = os.path.join(SCRIPT_DIR, 'xgb_sales_model_v3.pkl')
+NATIVE_MODEL_PATH = os.path.join(SCRIPT_DIR, 'xgb_sales_model_v3.ubj')
+PREDICTOR_PATH = os.path.join(SCRIPT_DIR, PREDICTOR_LIB)
+
+def convert_sales_data():
+    """Convert the sales CSV into a Parquet file with precomputed predictions"""
+    df = pd.read_csv(CSV_PATH)
+
+    # Python date objects are written as a date32 column, so readers get dates without re-parsing
+    df['ORDERDATE'] = pd.to_datetime(df['ORDERDATE']).dt.date
+
+    # Store numeric columns at their final width and repeated labels as dictionary-encoded categories
+    df = df.astype(DATA_DTYPES)
+    df['FESTIVAL'] = df['FESTIVAL'].astype('category')
+    df['DAY_OF_WEEK'] = df['DAY_OF_WEEK'].astype('category')
+
+    # Store the model's prediction for every row, so predict.py can answer without running the model
+    booster = xgb.Booster(model_file=NATIVE_MODEL_PATH)
+    predicted = booster.inplace_predict(df[FEATURE_COLUMNS].to_numpy(dtype=np.float32))
+    df['PREDICTED'] = np.round(predicted).astype(np.int16)
+
+    df.to_parquet(PARQUET_PATH, index=False)
+    print(f"✅ Wrote {len(df)} rows to {os.path.basename(PARQUET_PATH)}")
+
+def convert_model():
+    """Save the pickled model in XGBoost's native UBJSON format"""
+    booster = joblib.load(MODEL_PATH).get_booster()
+    booster.save_model(NATIVE_MODEL_PATH)
+    print(f"✅ Saved model to {os.path.basename(NATIVE_MODEL_PATH)}")
+
+def compile_predictor():
+    """Compile the XGBoost model into a native prediction library (optional)"""
+    try:
+        import treelite
+        import tl2cgen
+    except ImportError:
+        print("⚠️  treelite/tl2cgen not installed, skipping the compiled predictor")
+        print("Install them with: pip install treelite tl2cgen")
+        return False
+
+    booster = xgb.Booster(model_file=NATIVE_MODEL_PATH)
+    tl_model = treelite.frontend.from_xgboost(booster)
+    toolchain = 'msvc' if os.name == 'nt' else 'gcc'
+    tl2cgen.export_lib(tl_model, toolchain=toolchain, libpath=PREDICTOR_PATH, params={'parallel_comp': 4})
+    print(f"✅ Compiled model to {os.path.basename(PREDICTOR_PATH)}")
+    return True
+
+def main():
+    """Main function"""
+    # The model is converted first, since the data file stores its predictions
+    convert_model()
+    convert_sales_data()
+    compile_predictor()
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,32 @@ Configure OpenAI API Key for Sales Prediction Chatbot
 """
 
 import os
+import shutil
 from pathlib import Path
 
+# Result codes for _classify_api_key
+KEY_EMPTY, KEY_TOO_SHORT, KEY_NO_PREFIX, KEY_OK = range(4)
+
+_KEY_MESSAGES = {
+    KEY_EMPTY: "❌ API key cannot be empty!",
+    KEY_TOO_SHORT: "❌ API key seems too short. Please check and try again.",
+    KEY_NO_PREFIX: "⚠️  OpenAI API keys usually start with 'sk-'. Are you sure this is correct? (y/n)",
+}
+
+def _private_opener(path, flags):
+    """Open a new file readable only by its owner, since it holds the API key"""
+    return os.open(path, flags, 0o600)
+
+def _classify_api_key(api_key):
+    """Classify an already stripped API key with one of the KEY_* codes"""
+    if not api_key:
+        return KEY_EMPTY
+    if len(api_key) < 20:
+        return KEY_TOO_SHORT
+    if not api_key.startswith('sk-'):
+        return KEY_NO_PREFIX
+    return KEY_OK
+
 def configure_api_key():
     """Interactive script to configure OpenAI API key"""
     
@@ -23,43 +47,38 @@ def configure_api_key():
     
     while True:
         api_key = input("\nAPI Key: ").strip()
+        status = _classify_api_key(api_key)
+        if status == KEY_OK:
+            break
         
-        if not api_key:
-            print("❌ API key cannot be empty!")
-            continue
-        
-        if len(api_key) < 20:
-            print("❌ API key seems too short. Please check and try again.")
-            continue
-        
-        if not api_key.startswith('sk-'):
-            print("⚠️  OpenAI API keys usually start with 'sk-'. Are you sure this is correct? (y/n)")
-            confirm = input().strip().lower()
-            if confirm not in ['y', 'yes']:
-                continue
-        
-        break
+        print(_KEY_MESSAGES[status])
+        if status == KEY_NO_PREFIX and input().strip().lower() in ('y', 'yes'):
+            break
     
-    # Read current .env file
+    # Stream the current .env file into a temporary file, then swap it in
+    tmp_file = env_file.with_name(env_file.name + '.tmp')
     try:
-        with open(env_file, 'r') as f:
-            content = f.read()
-        
-        # Replace the API key
-        if "OPENAI_API_KEY=" in content:
-            lines = content.split('\n')
-            for i, line in enumerate(lines):
-                if line.startswith('OPENAI_API_KEY='):
-                    lines[i] = f'OPENAI_API_KEY={api_key}'
-                    break
-            content = '\n'.join(lines)
-        else:
+        found = False
+        last_line = '\n'
+        with open(env_file, 'r') as f_in, open(tmp_file, 'w', opener=_private_opener) as f_out:
+            for line in f_in:
+                # Replace the API key
+                if not found and line.startswith('OPENAI_API_KEY='):
+                    line = f'OPENAI_API_KEY={api_key}' + ('\n' if line.endswith('\n') else '')
+                    found = True
+                f_out.write(line)
+                last_line = line
+            
             # Add the API key if not present
-            content += f'\nOPENAI_API_KEY={api_key}\n'
+            if not found:
+                if not last_line.endswith('\n'):
+                    f_out.write('\n')
+                f_out.write(f'OPENAI_API_KEY={api_key}\n')
         
-        # Write back to file
-        with open(env_file, 'w') as f:
-            f.write(content)
+        # Keep the original file's permissions (e.g. chmod 600), then rename atomically,
+        # so a crash never leaves a half-written .env behind
+        shutil.copymode(env_file, tmp_file)
+        os.replace(tmp_file, env_file)
         
         print("✅ API key configured successfully!")
         print("\nYou can now run:")
@@ -69,6 +88,8 @@ def configure_api_key():
         return True
         
     except Exception as e:
+        if tmp_file.exists():
+            tmp_file.unlink()
         print(f"❌ Error configuring API key: {e}")
         return False
 
@@ -3,21 +3,24 @@ Test script to demonstrate the Sales Prediction Chatbot
 This will show a complete interaction workflow
 """
 
-from sales_chatbot import SalesPredictionChatbot
+from sales_chatbot import SalesPredictionChatbot, configure_logging
+import io
 import os
+import sys
 from dotenv import load_dotenv
 
+# Load environment variables once per process
+load_dotenv()
+API_KEY = os.getenv('OPENAI_API_KEY')
+
 def run_complete_demo():
     """Run a complete demonstration of the chatbot"""
     
     print("🚀 Starting Sales Prediction Chatbot Demo")
     print("=" * 50)
     
-    # Load environment variables
-    load_dotenv()
-    
     # Get API key
-    api_key = os.getenv('OPENAI_API_KEY')
+    api_key = API_KEY
     if not api_key or api_key == 'your-openai-api-key-here':
         print("❌ Please configure your OpenAI API key in the .env file")
         return
@@ -40,39 +43,57 @@ def run_complete_demo():
         print("🧪 Running Test Queries:")
         print("=" * 30)
         
-        for i, query in enumerate(test_queries, 1):
-            print(f"\n📝 Test {i}: '{query}'")
-            print("-" * 40)
-            
-            try:
-                # Process the query
-                response = chatbot.handle_query(query)
-                print(f"🤖 Response: {response}")
-                
-            except Exception as e:
-                print(f"❌ Error processing query: {e}")
-            
-            print()
+        try:
+            # Process all queries together so their predictions share one model call
+            responses = chatbot.handle_queries(test_queries)
+        except Exception as e:
+            # Retry one at a time, so a single failing query doesn't hide the others' results
+            print(f"⚠️  Batch processing failed ({e}), processing queries one at a time")
+            responses = []
+            for query in test_queries:
+                try:
+                    responses.append(chatbot.handle_query(query))
+                except Exception as e:
+                    responses.append(e)
         
-        print("🎉 Demo completed successfully!")
-        print("\n📊 Conversation History:")
-        print("-" * 25)
+        # Render the results into one buffer and write it out once
+        buf = io.StringIO()
+        failures = 0
+        for i, (query, response) in enumerate(zip(test_queries, responses), 1):
+            buf.write(f"\n📝 Test {i}: '{query}'\n")
+            buf.write("-" * 40 + "\n")
+            if isinstance(response, Exception):
+                failures += 1
+                buf.write(f"❌ Error processing query: {response}\n\n")
+            else:
+                buf.write(f"🤖 Response: {response}\n\n")
+        
+        if failures:
+            buf.write(f"💥 {failures} of {len(test_queries)} queries failed.\n")
+        else:
+            buf.write("🎉 Demo completed successfully!\n")
+        buf.write("\n📊 Conversation History:\n")
+        buf.write("-" * 25 + "\n")
         
         for i, conversation in enumerate(chatbot.conversation_history, 1):
-            print(f"\n{i}. Query: {conversation['query']}")
-            print(f"   Parameters: {conversation['parameters']}")
-            print(f"   Result: {conversation['result']}")
-            print(f"   Response: {conversation['response']}")
+            buf.write(f"\n{i}. Query: {conversation['query']}\n")
+            buf.write(f"   Parameters: {conversation['parameters']}\n")
+            buf.write(f"   Result: {conversation['result']}\n")
+            buf.write(f"   Response: {conversation['response']}\n")
+        
+        sys.stdout.write(buf.getvalue())
         
-        return True
+        return not failures
         
     except Exception as e:
         print(f"❌ Error running demo: {e}")
         return False
 
 if __name__ == "__main__":
+    configure_logging()
     success = run_complete_demo()
     if success:
         print("\n✨ All tests completed successfully!")
     else:
         print("\n💥 Demo failed. Please check the configuration.")
+        sys.exit(1)
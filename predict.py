@@ -1,68 +1,240 @@
-import pandas as pd
-import joblib
-from datetime import datetime
+from datetime import date
+import logging
 import numpy as np
-import argparse
 import os
+import re
+import sys
+from functools import lru_cache
 
-def predict_sales(mapped_item_id, date_str):
+logger = logging.getLogger(__name__)
+
+# Columns needed for the lookup and the model's feature vector
+DATA_COLUMNS = ['ITEMID_Mapped', 'ORDERDATE', 'TOTAL_ITEMSOLD', 'DAY', 'MONTH', 'YEAR',
+                'DAY_NUM', 'IS_WEEKEND', 'FESTIVAL_ENC', 'ROLLING_3DAY_AVG']
+
+# Accepts the same YYYY-MM-DD strings as strptime('%Y-%m-%d'), including unpadded months and days
+_DATE_RE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})')
+
+# Model inputs, in the order the model was trained on
+FEATURE_COLUMNS = ['ITEMID_Mapped', 'DAY', 'MONTH', 'YEAR', 'DAY_NUM', 'IS_WEEKEND',
+                   'FESTIVAL_ENC', 'ROLLING_3DAY_AVG']
+
+# Explicit column types skip CSV dtype inference and keep columns at their final width.
+# build_artifacts.py writes the Parquet file with the same types.
+# TOTAL_ITEMSOLD is written as "4.0" in the CSV, so it stays a float.
+DATA_DTYPES = {
+    'ITEMID_Mapped': 'int32',
+    'TOTAL_ITEMSOLD': 'float32',
+    'DAY': 'int8',
+    'MONTH': 'int8',
+    'YEAR': 'int16',
+    'DAY_NUM': 'int8',
+    'IS_WEEKEND': 'int8',
+    'FESTIVAL_ENC': 'int16',
+    'ROLLING_3DAY_AVG': 'float32',
+}
+
+# Native prediction library compiled by build_artifacts.py (optional)
+PREDICTOR_LIB = 'xgb_sales_model_v3' + ('.dll' if os.name == 'nt' else '.dylib' if sys.platform == 'darwin' else '.so')
+
+# Dates are keyed as int32 day numbers counted from this epoch
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Rows read at a time, so loading never holds the whole data file in memory
+CHUNK_ROWS = 200_000
+
+def _read_data_chunks(data_path):
+    """
+    Yields the needed columns of the sales data in chunks, with ORDERDATE as
+    int32 days since 1970-01-01. Parquet files built by build_artifacts.py
+    also carry a PREDICTED column.
+    """
+    import pandas as pd
+
+    if data_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        # Memory-mapping lets several chatbot processes share the file's pages
+        parquet_file = pq.ParquetFile(data_path, memory_map=True)
+        columns = DATA_COLUMNS + [c for c in ['PREDICTED'] if c in parquet_file.schema_arrow.names]
+        chunks = (batch.to_pandas(date_as_object=False)
+                  for batch in parquet_file.iter_batches(batch_size=CHUNK_ROWS, columns=columns))
+    else:
+        chunks = pd.read_csv(data_path, usecols=DATA_COLUMNS, dtype=DATA_DTYPES,
+                             parse_dates=['ORDERDATE'], chunksize=CHUNK_ROWS)
+
+    for chunk in chunks:
+        chunk['ORDERDATE'] = chunk['ORDERDATE'].to_numpy().astype('datetime64[D]').astype(np.int32)
+        yield chunk
+
+def _load_compiled_predictor(predictor_path):
     """
-    Loads a trained model and data to predict sales for a single item-date pair.
+    Loads the compiled model library, or returns None if it can't be used.
     """
     try:
-        # Get the directory where this script is located
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # Define file paths relative to the script's location
-        model_path = os.path.join(script_dir, 'xgb_sales_model_v3.pkl')
-        data_path = os.path.join(script_dir, 'sales_data_with_mapped_ids_v3.csv')
-
-        # Check if all required files exist
-        for f in [model_path, data_path]:
-            if not os.path.exists(f):
-                return f"Error: Required file not found - '{f}'. Make sure it's in the same directory as the script."
-
-        # Load the model and the data file
-        model = joblib.load(model_path)
-        df = pd.read_csv(data_path)
-        df['ORDERDATE'] = pd.to_datetime(df['ORDERDATE']).dt.date
+        import tl2cgen
+    except ImportError:
+        return None
+
+    try:
+        predictor = tl2cgen.Predictor(predictor_path)
     except Exception as e:
-        return f"An error occurred during file loading: {e}"
+        # e.g. a library built on another platform or against another libtl2cgen version
+        logger.warning("Can't load the compiled predictor %s, using the XGBoost model instead: %s",
+                       predictor_path, e)
+        return None
+
+    def predict(features):
+        return predictor.predict(tl2cgen.DMatrix(features)).ravel()
+
+    return predict
+
+@lru_cache(maxsize=1)
+def _load_predictor(script_dir):
+    """
+    Loads the model once per process and returns a prediction function for
+    float32 feature matrices. Only needed for rows without a precomputed prediction.
+    """
+    # Define file paths relative to the script's location
+    model_path = os.path.join(script_dir, 'xgb_sales_model_v3.ubj')
+    pickle_model_path = os.path.join(script_dir, 'xgb_sales_model_v3.pkl')
+    predictor_path = os.path.join(script_dir, PREDICTOR_LIB)
+
+    # Prefer the compiled predictor, keep the XGBoost model as the fallback
+    if os.path.exists(predictor_path):
+        predict_fn = _load_compiled_predictor(predictor_path)
+        if predict_fn is not None:
+            return predict_fn
+
+    # Prefer the native model built by build_artifacts.py, fall back to the pickle
+    if not os.path.exists(model_path):
+        model_path = pickle_model_path
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Required file not found - '{model_path}'. Make sure it's in the same directory as the script.")
+
+    # Imported here so that importing predict.py stays cheap until the first prediction
+    if model_path == pickle_model_path:
+        import joblib
+        booster = joblib.load(model_path).get_booster()
+    else:
+        # The native format loads straight into a Booster without unpickling
+        import xgboost as xgb
+        booster = xgb.Booster(model_file=model_path)
+
+    # inplace_predict skips building a DMatrix
+    return booster.inplace_predict
+
+@lru_cache(maxsize=1)
+def _load_artifacts(script_dir):
+    """
+    Loads the sales data once per process.
+    Returns a dict mapping (mapped item id, day number) to (actual units sold,
+    precomputed prediction, float32 feature vector). Rows come with either a
+    precomputed prediction or a feature vector, the other is None.
+    """
+    # Define file paths relative to the script's location
+    parquet_path = os.path.join(script_dir, 'sales_data_v3.parquet')
+    csv_path = os.path.join(script_dir, 'sales_data_with_mapped_ids_v3.csv')
+
+    # Prefer the Parquet file built by build_artifacts.py, fall back to the CSV
+    data_path = parquet_path if os.path.exists(parquet_path) else csv_path
+    if not os.path.exists(data_path):
+        raise FileNotFoundError(f"Required file not found - '{data_path}'. Make sure it's in the same directory as the script.")
+
+    # Build the lookup table chunk by chunk; the full DataFrame is never materialized
+    table = {}
+    for chunk in _read_data_chunks(data_path):
+        actuals = chunk['TOTAL_ITEMSOLD'].to_numpy(dtype=np.int32).tolist()
+        # Plain lists iterate without boxing each element through the pandas Series machinery
+        keys = zip(chunk['ITEMID_Mapped'].tolist(), chunk['ORDERDATE'].tolist())
+
+        if 'PREDICTED' in chunk:
+            # Predictions were computed offline, so the model is not needed for these rows
+            values = zip(actuals, chunk['PREDICTED'].tolist(), [None] * len(chunk))
+        else:
+            # Precompute the model inputs once, so a prediction is a single dict probe
+            features = chunk[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+            values = zip(actuals, [None] * len(chunk), features)
+
+        # Keep the first row for each (item, date), like the original row filter did
+        for key, value in zip(keys, values):
+            table.setdefault(key, value)
+
+    return table
+
+def predict_sales(mapped_item_id, date_str):
+    """
+    Uses the cached model and data to predict sales for a single item-date pair.
+    """
+    return predict_sales_batch([mapped_item_id], [date_str])[0]
+
+def predict_sales_batch(mapped_item_ids, date_strs):
+    """
+    Predicts sales for several item-date pairs with at most one model call.
+    Returns one result string per pair, in the same format as predict_sales.
+    """
+    # Get the directory where this script is located
+    script_dir = os.path.dirname(os.path.abspath(__file__))
 
-    # Convert input date string to a date object for comparison
     try:
-        input_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    except ValueError:
-        return "Error: Invalid date format. Please use 'YYYY-MM-DD'."
+        # Data is loaded on the first call and reused afterwards
+        table = _load_artifacts(script_dir)
+    except FileNotFoundError as e:
+        return [f"Error: {e}"] * len(date_strs)
+    except Exception as e:
+        return [f"An error occurred during file loading: {e}"] * len(date_strs)
 
-    # Find the specific row in the dataframe that matches the input
-    target_row = df[(df['ITEMID_Mapped'] == mapped_item_id) & (df['ORDERDATE'] == input_date)]
+    results = []
+    found = []  # (position in results, actual units sold, feature vector)
+    for mapped_item_id, date_str in zip(mapped_item_ids, date_strs):
+        # Convert input date string to a day number for comparison
+        # A failed match is None, which raises TypeError when indexed
+        match = _DATE_RE.fullmatch(date_str)
+        try:
+            input_day = date(int(match[1]), int(match[2]), int(match[3])).toordinal() - _EPOCH_ORDINAL
+        except (TypeError, ValueError):
+            results.append("Error: Invalid date format. Please use 'YYYY-MM-DD'.")
+            continue
 
-    if target_row.empty:
-        return f"No historical data found for Mapped ITEMID {mapped_item_id} on {date_str}."
+        # Find the specific row that matches the input
+        entry = table.get((mapped_item_id, input_day))
+        if entry is None:
+            results.append(f"No historical data found for Mapped ITEMID {mapped_item_id} on {date_str}.")
+            continue
 
-    # Get the actual value from this row
-    actual_value = target_row['TOTAL_ITEMSOLD'].iloc[0]
+        actual_value, predicted_value, feature_row = entry
+        if predicted_value is not None:
+            results.append(f"Actual: {actual_value}, Predicted: {predicted_value}")
+            continue
 
-    # The feature vector for the model is already pre-calculated in the CSV
-    features_for_prediction = [
-        target_row['ITEMID_Mapped'].iloc[0],
-        target_row['DAY'].iloc[0],
-        target_row['MONTH'].iloc[0],
-        target_row['YEAR'].iloc[0],
-        target_row['DAY_NUM'].iloc[0],
-        target_row['IS_WEEKEND'].iloc[0],
-        target_row['FESTIVAL_ENC'].iloc[0],
-        target_row['ROLLING_3DAY_AVG'].iloc[0]
-    ]
+        found.append((len(results), actual_value, feature_row))
+        results.append(None)
 
-    # Predict and round the result
-    predicted_value_float = model.predict([features_for_prediction])[0]
-    predicted_value = int(round(predicted_value_float))
+    if not found:
+        return results
 
-    return f"Actual: {int(actual_value)}, Predicted: {predicted_value}"
+    try:
+        # The model is loaded on the first live prediction and reused afterwards
+        predict_fn = _load_predictor(script_dir)
+    except Exception as e:
+        error = f"Error: {e}" if isinstance(e, FileNotFoundError) else f"An error occurred during file loading: {e}"
+        for position, _, _ in found:
+            results[position] = error
+        return results
+
+    # One prediction call for the whole batch
+    features_for_prediction = np.stack([feature_row for _, _, feature_row in found])
+    predicted_values = predict_fn(features_for_prediction)
+
+    for (position, actual_value, _), predicted_value_float in zip(found, predicted_values):
+        predicted_value = int(round(predicted_value_float))
+        results[position] = f"Actual: {actual_value}, Predicted: {predicted_value}"
+
+    return results
 
 if __name__ == '__main__':
+    import argparse
+
     parser = argparse.ArgumentParser(description="Predict sales for a given mapped item ID and date.")
     parser.add_argument("mapped_id", type=int, help="The mapped ITEMID (e.g., 3).")
     parser.add_argument("date", type=str, help="The date in YYYY-MM-DD format (e.g., 2024-05-01).")
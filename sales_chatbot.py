@@ -1,60 +1,360 @@
+import asyncio
 import openai
 import re
 import json
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import os
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 import logging
-from predict import predict_sales
+from predict import DATA_DTYPES, predict_sales, predict_sales_batch
 from dotenv import load_dotenv
 import calendar
-from collections import defaultdict
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+
+# orjson parses the model's small JSON replies several times faster, but is optional
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Handlers and levels are left to the application that imports this module, see configure_logging
 logger = logging.getLogger(__name__)
 
+# Columns the analytics queries need from the sales data
+SUMMARY_COLUMNS = ['ITEMID_Mapped', 'ORDERDATE', 'TOTAL_ITEMSOLD']
+
+# Static system prompts. Anything that changes per call goes into a separate message
+# after these, so every request shares the same prefix. OpenAI only caches prefixes
+# of 1024 tokens or more, so keep the extraction prompt's examples above that size.
+# Responses use gpt-3.5-turbo, which has no prompt caching; their prompt follows the
+# same layout only for consistency.
+EXTRACTION_PROMPT = """You are a parameter extraction assistant for a sales prediction and analytics system.
+
+Analyze the user query and determine the query type and extract relevant parameters.
+The available item IDs, the available date range and the current date are given in the next message.
+
+QUERY TYPES:
+1. "prediction" - User wants to predict sales for specific item and date
+2. "analysis" - User wants to analyze historical sales data
+3. "most_sold" - User wants to find the most sold item in a period
+4. "summary" - User wants sales summary for item/period
+
+Extract these parameters:
+- query_type: one of the above types
+- item_id: integer (if specified)
+- date: YYYY-MM-DD format (if single date)
+- date_range: list of dates or period description
+- month: month number (1-12) if mentioned
+- year: year if mentioned
+- period_description: natural description of time period
+
+For date formats:
+- "4-5-2024" should be interpreted as 4th May 2024 (DD-MM-YYYY)
+- "whole may" or "entire may" means all days in May
+- "may 2024" means May 2024
+- Handle relative dates like "tomorrow", "next week" using the current date
+
+Return the parameters by calling the extract_sales_query function with an object like:
+{
+    "query_type": "<prediction|analysis|most_sold|summary>",
+    "item_id": <integer or null>,
+    "date": "<YYYY-MM-DD or null>",
+    "date_range": ["YYYY-MM-DD", ...] or null,
+    "month": <1-12 or null>,
+    "year": <year or null>,
+    "period_description": "<description or null>",
+    "confidence": <float between 0-1>,
+    "missing_info": ["list of missing required parameters"],
+    "clarification_needed": "<question to ask user if parameters unclear>"
+}
+
+Examples:
+- "Predict sales for item 3 on 2024-05-01" → {"query_type": "prediction", "item_id": 3, "date": "2024-05-01", "confidence": 1.0, "missing_info": []}
+- "Sales for item 2 on 4-5-2024" → {"query_type": "prediction", "item_id": 2, "date": "2024-05-04", "confidence": 0.9, "missing_info": []}
+- "Which was most sold item in may" → {"query_type": "most_sold", "month": 5, "year": 2024, "period_description": "May 2024", "confidence": 0.9, "missing_info": []}
+- "Which item sold the most in May 2024?" → {"query_type": "most_sold", "month": 5, "year": 2024, "period_description": "May 2024", "confidence": 1.0, "missing_info": []}
+- "Sales for item 2 whole may" → {"query_type": "summary", "item_id": 2, "month": 5, "period_description": "whole May", "confidence": 0.9, "missing_info": []}
+- "Show me sales summary for item 1 in May 2024" → {"query_type": "summary", "item_id": 1, "month": 5, "year": 2024, "period_description": "May 2024", "confidence": 1.0, "missing_info": []}
+- "Total sales for item 3 whole May" → {"query_type": "summary", "item_id": 3, "month": 5, "period_description": "whole May", "confidence": 0.9, "missing_info": []}
+- "How did item 4 do in June 2024?" → {"query_type": "analysis", "item_id": 4, "month": 6, "year": 2024, "period_description": "June 2024", "confidence": 0.9, "missing_info": []}
+- "What about item 5 tomorrow?" (current date 2024-05-10) → {"query_type": "prediction", "item_id": 5, "date": "2024-05-11", "confidence": 0.9, "missing_info": []}
+- "Most sold item in April" → {"query_type": "most_sold", "month": 4, "year": 2024, "period_description": "April 2024", "confidence": 0.9, "missing_info": []}
+- "on 4 may" → {"query_type": "prediction", "date": "2024-05-04", "confidence": 0.7, "missing_info": ["item_id"], "clarification_needed": "Which item would you like to predict sales for on May 4th?"}
+- "4-5-2024" → {"query_type": "prediction", "date": "2024-05-04", "confidence": 0.8, "missing_info": ["item_id"], "clarification_needed": "Which item would you like to predict sales for on May 4th, 2024?"}
+- "Predict sales for item 7" → {"query_type": "prediction", "item_id": 7, "confidence": 0.7, "missing_info": ["date"], "clarification_needed": "Which date would you like to predict sales for item 7 on?"}
+"""
+
+# Function the extraction model is made to call. Its arguments are always a JSON object of
+# this shape, so replies never need to be recovered from free-form text.
+EXTRACTION_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "extract_sales_query",
+        "description": "Record the query type and parameters extracted from a sales query",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query_type": {"type": "string", "enum": ["prediction", "analysis", "most_sold", "summary"]},
+                "item_id": {"type": ["integer", "null"]},
+                "date": {"type": ["string", "null"], "description": "Single date as YYYY-MM-DD"},
+                "date_range": {"type": ["array", "null"], "items": {"type": "string"}},
+                "month": {"type": ["integer", "null"], "minimum": 1, "maximum": 12},
+                "year": {"type": ["integer", "null"]},
+                "period_description": {"type": ["string", "null"]},
+                "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+                "missing_info": {"type": "array", "items": {"type": "string"}},
+                "clarification_needed": {"type": ["string", "null"]}
+            },
+            "required": ["query_type", "confidence", "missing_info"]
+        }
+    }
+}
+
+# Packed variants for handle_queries(packed=True): one request covers several queries,
+# and the arrays come back in the same order as the queries
+EXTRACTION_LIST_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "extract_sales_queries",
+        "description": "Record the query type and parameters of each numbered sales query, in order",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "queries": {"type": "array", "items": EXTRACTION_TOOL["function"]["parameters"]}
+            },
+            "required": ["queries"]
+        }
+    }
+}
+
+RESPONSES_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "write_responses",
+        "description": "Record one response per numbered prediction result, in order",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "responses": {"type": "array", "items": {"type": "string"}}
+            },
+            "required": ["responses"]
+        }
+    }
+}
+
+RESPONSE_PROMPT = """You are a helpful sales prediction assistant. Generate a natural, conversational response based on the prediction results.
+The user's query, the extracted parameters and the prediction result are given in the next message.
+
+Guidelines:
+1. Be conversational and helpful
+2. Explain the prediction clearly
+3. Mention both actual and predicted values if available
+4. Add context about the prediction (e.g., if it's higher/lower than actual)
+5. Offer to help with more predictions
+6. Keep it concise but informative
+
+Avoid technical jargon and make it user-friendly.
+"""
+
+# Extraction requests sharing a cache key are routed together, which improves prefix cache hits
+EXTRACTION_CACHE_KEY = "sales-extract-v1"
+
+# Number of distinct queries whose extracted parameters are kept in memory
+EXTRACTION_CACHE_SIZE = 512
+
+# Number of answered queries whose responses are kept in memory
+RESPONSE_CACHE_SIZE = 256
+
+# Oldest exchanges are dropped from the chat history sent to the model past this size
+MAX_HISTORY_TOKENS = 2000
+
+# Chat messages (the last user/assistant exchange) sent with each extraction request
+EXTRACTION_HISTORY_MESSAGES = 2
+
+def configure_logging(default_level: str = "INFO"):
+    """
+    Set up logging for a script or app entry point. The LOG_LEVEL environment variable
+    overrides default_level; an unknown level falls back to WARNING. The HTTP client
+    libraries log every request at INFO, so they stay at WARNING.
+    """
+    level = os.getenv("LOG_LEVEL", default_level).upper()
+    valid = isinstance(logging.getLevelName(level), int)
+    # Streamlit runs this on every rerun; only the first call sets up the handler and warns
+    first_call = not logging.getLogger().handlers
+    logging.basicConfig(level=level if valid else logging.WARNING)
+    if first_call and not valid:
+        logger.warning("Unknown LOG_LEVEL %r, using WARNING", level)
+    for noisy_logger in ("httpx", "openai", "urllib3"):
+        logging.getLogger(noisy_logger).setLevel(logging.WARNING)
+
+class _FailedResponse(str):
+    """Response text written after an error; it is shown to the user but never cached"""
+
+def _estimate_tokens(messages: List[Dict]) -> int:
+    """Rough token count for chat messages (about 4 characters per token)"""
+    return sum(len(message["content"]) for message in messages) // 4
+
+def _normalize_query(user_query: str) -> str:
+    """Lowercase a query and collapse its whitespace, so trivially different retypes share a cache entry"""
+    return " ".join(user_query.lower().split())
+
+# Month names and abbreviations ("may", "sep", "sept", "september") mapped to month numbers
+_MONTHS = {name.lower(): number for number in range(1, 13)
+           for name in (calendar.month_name[number], calendar.month_abbr[number])}
+_MONTHS['sept'] = 9
+
+@lru_cache(maxsize=1)
+def _load_sales_context(script_dir: str) -> Dict:
+    """
+    Load the sales data and the aggregates the analytics queries use, once per process.
+    Every chatbot instance shares the result, so none of it may be modified.
+    Errors raise and are not cached.
+    
+    Returns:
+        Dict: Chatbot attribute names mapped to their values
+    """
+    parquet_path = os.path.join(script_dir, 'sales_data_v3.parquet')
+    csv_path = os.path.join(script_dir, 'sales_data_with_mapped_ids_v3.csv')
+    
+    # Prefer the Parquet file built by build_artifacts.py, fall back to the CSV
+    if os.path.exists(parquet_path):
+        import pyarrow.parquet as pq
+        
+        # ORDERDATE is stored as a date column, so it arrives as datetime64 without parsing
+        table = pq.read_table(parquet_path, columns=SUMMARY_COLUMNS, memory_map=True)
+        df = table.to_pandas(date_as_object=False)
+    else:
+        df = pd.read_csv(csv_path, engine='pyarrow', usecols=SUMMARY_COLUMNS,
+                         dtype={c: DATA_DTYPES[c] for c in ('ITEMID_Mapped', 'TOTAL_ITEMSOLD')},
+                         parse_dates=['ORDERDATE'])
+    
+    # Item ids fit in int16 and units sold are whole numbers, so the scans touch fewer bytes
+    df = df.astype({'ITEMID_Mapped': 'int16', 'TOTAL_ITEMSOLD': 'int32'})
+    
+    context = {'df': df}
+    context['available_items'] = sorted(df['ITEMID_Mapped'].unique().tolist())
+    context['date_range'] = {
+        'min_date': df['ORDERDATE'].min().strftime('%Y-%m-%d'),
+        'max_date': df['ORDERDATE'].max().strftime('%Y-%m-%d')
+    }
+    
+    # The data is static, so precompute units sold per item for the common most-sold filters
+    rank_items = SalesPredictionChatbot._rank_items
+    years = df['ORDERDATE'].dt.year
+    months = df['ORDERDATE'].dt.month
+    context['_sales_by_year_month'] = {
+        (int(year), int(month)): rank_items(group)
+        for (year, month), group in df.groupby([years, months])
+    }
+    context['_sales_by_year'] = {int(year): rank_items(group) for year, group in df.groupby(years)}
+    context['_sales_total'] = rank_items(df)
+    
+    # Plain arrays for the month-only fallback in find_most_sold_item
+    context['_items'] = df['ITEMID_Mapped'].to_numpy()
+    context['_units'] = df['TOTAL_ITEMSOLD'].to_numpy()
+    context['_months'] = months.to_numpy(dtype=np.int8)
+    context['_n_items'] = int(context['_items'].max()) + 1
+    
+    # Units sold per (item, day), so summaries for one item look days up instead of scanning
+    context['_daily'] = df.groupby(['ITEMID_Mapped', 'ORDERDATE'])['TOTAL_ITEMSOLD'].sum()
+    
+    logger.info("Loaded context: %d items, dates from %s to %s",
+                len(context['available_items']), context['date_range']['min_date'], context['date_range']['max_date'])
+    return context
+
 class SalesPredictionChatbot:
-    def __init__(self, openai_api_key: str):
+    # Day-first dates such as "4-5-2024", compiled once for all calls to _parse_date_input
+    _DMY_RE = re.compile(r'^(\d{1,2})-(\d{1,2})-(\d{4})$')
+    
+    # Patterns for _rule_extract, which answers simple, self-contained queries without the LLM
+    _RULE_ITEM_RE = re.compile(r'\bitem\s*(?:id\s*)?#?(\d+)\b')
+    _RULE_DATE_RE = re.compile(r'\b(?:(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})-(\d{1,2})-(\d{4}))\b')
+    _RULE_MOST_SOLD_RE = re.compile(r'\b(?:most sold|sold the most|best[- ]selling|top[- ]selling)\b')
+    _RULE_MONTH_RE = re.compile(r'\b(' + '|'.join(sorted(_MONTHS, key=len, reverse=True)) + r')\b')
+    _RULE_YEAR_RE = re.compile(r'\b(\d{4})\b')
+    _RULE_RELATIVE_RE = re.compile(r'\b(?:last|this|next|previous|past)\b')
+    # Words that make an item-and-date query something other than a single-day prediction
+    _RULE_NOT_PREDICTION_RE = re.compile(r'summar|total|most|analy|average|compare|trend|whole|entire|'
+                                         r'week|month|top|best|between')
+    
+    def __init__(self, openai_api_key: str, client: Optional[openai.OpenAI] = None):
         """
         Initialize the Sales Prediction Chatbot
         
         Args:
             openai_api_key (str): OpenAI API key for LLM integration
+            client (Optional[openai.OpenAI]): Existing client to share between chatbots, if any
         """
-        self.client = openai.OpenAI(api_key=openai_api_key)
+        self.client = client if client is not None else openai.OpenAI(api_key=openai_api_key)
         self.conversation_history = []
         
+        # Chat history sent back to the model as {"role", "content"} messages. Entries are only
+        # appended or dropped from the front, so each request's prefix matches the previous one.
+        self.message_history = []
+        
         # Load available item IDs and date ranges for better context
         self._load_data_context()
         
+        # Extraction results as JSON strings, keyed by _extraction_key, least recently used first.
+        # Errors raise and are never cached.
+        self._items_fingerprint = hash(tuple(self.available_items))
+        self._extraction_cache = OrderedDict()
+        
+        # (response, prediction result) pairs keyed by normalized query and extracted parameters,
+        # least recently used first
+        self._response_cache = OrderedDict()
+        
+        # Guards the response cache and the chat history when ahandle_query runs queries in threads
+        self._lock = threading.Lock()
+        
     def _load_data_context(self):
         """Load context about available data for better parameter extraction"""
         try:
             # Get the directory where this script is located
             script_dir = os.path.dirname(os.path.abspath(__file__))
-            data_path = os.path.join(script_dir, 'sales_data_with_mapped_ids_v3.csv')
-            
-            self.df = pd.read_csv(data_path)
-            self.df['ORDERDATE'] = pd.to_datetime(self.df['ORDERDATE'])
             
-            self.available_items = sorted(self.df['ITEMID_Mapped'].unique().tolist())
-            self.date_range = {
-                'min_date': self.df['ORDERDATE'].min().strftime('%Y-%m-%d'),
-                'max_date': self.df['ORDERDATE'].max().strftime('%Y-%m-%d')
-            }
-            
-            logger.info(f"Loaded context: {len(self.available_items)} items, dates from {self.date_range['min_date']} to {self.date_range['max_date']}")
+            # Loaded once per process and shared by every chatbot; only the chat state is per instance
+            vars(self).update(_load_sales_context(script_dir))
             
         except Exception as e:
-            logger.error(f"Error loading data context: {e}")
+            logger.error("Error loading data context: %s", e)
             self.available_items = []
             self.date_range = {'min_date': '2020-01-01', 'max_date': '2024-12-31'}
             self.df = None
+            self._sales_by_year_month = {}
+            self._sales_by_year = {}
+            self._sales_total = None
+            self._daily = None
+            self._months = None
+        
+        # The items and date range don't change at runtime, so the help text is built once
+        self._help_message = self._build_help_message()
+
+    @staticmethod
+    def _rank_items(df: pd.DataFrame) -> pd.Series:
+        """Total units sold per item, highest first"""
+        return df.groupby('ITEMID_Mapped')['TOTAL_ITEMSOLD'].sum().sort_values(ascending=False)
+
+    def _sum_by_item(self, mask: np.ndarray) -> Optional[pd.Series]:
+        """Total units sold per item over the masked rows, highest first, or None if no rows match"""
+        items = self._items[mask]
+        if len(items) == 0:
+            return None
+        
+        # bincount sums by item id directly, without building a groupby
+        counts = np.bincount(items, minlength=self._n_items)
+        totals = np.bincount(items, weights=self._units[mask], minlength=self._n_items)
+        present = np.flatnonzero(counts)
+        sales = pd.Series(totals[present].astype(self._units.dtype), index=present)
+        return sales.sort_values(ascending=False)
 
     def _parse_date_input(self, date_str: str) -> List[str]:
         """
@@ -71,29 +371,16 @@ class SalesPredictionChatbot:
             
         date_str = date_str.lower().strip()
         
-        # Handle "whole may", "entire may", "all of may"
-        if any(word in date_str for word in ['whole', 'entire', 'all of']) and 'may' in date_str:
-            year = datetime.now().year
-            if '2024' in date_str:
-                year = 2024
-            return [f"{year}-05-{day:02d}" for day in range(1, 32)]
-        
-        # Handle "may 2024", "may"
+        # Handle "may 2024", "may", "whole may", "entire may", "all of may"
         if 'may' in date_str:
-            year = datetime.now().year
-            if '2024' in date_str:
-                year = 2024
+            year = 2024 if '2024' in date_str else datetime.now().year
             return [f"{year}-05-{day:02d}" for day in range(1, 32)]
         
         # Handle "4-5-2024" (assume DD-MM-YYYY)
-        if re.match(r'\d{1,2}-\d{1,2}-\d{4}', date_str):
-            parts = date_str.split('-')
-            if len(parts) == 3:
-                day, month, year = parts
-                try:
-                    return [f"{year}-{month.zfill(2)}-{day.zfill(2)}"]
-                except:
-                    pass
+        match = self._DMY_RE.match(date_str)
+        if match:
+            day, month, year = match.groups()
+            return [f"{year}-{month.zfill(2)}-{day.zfill(2)}"]
         
         # Handle standard formats
         try:
@@ -104,6 +391,62 @@ class SalesPredictionChatbot:
             
         return []
 
+    def _rule_extract(self, normalized_query: str) -> Optional[Dict]:
+        """
+        Extract parameters from simple queries with regular expressions, skipping the LLM.
+        Handles a single item on a single explicit date, and the most sold item in a month.
+        Anything else, including queries that depend on the chat history, returns None.
+        
+        Args:
+            normalized_query (str): Lowercased, whitespace-collapsed user query
+            
+        Returns:
+            Optional[Dict]: Parameters in the same shape as the LLM extraction, or None
+        """
+        
+        # "Predict sales for item 3 on 2024-05-01", "sales for item 2 on 4-5-2024"
+        items = self._RULE_ITEM_RE.findall(normalized_query)
+        dates = list(self._RULE_DATE_RE.finditer(normalized_query))
+        if len(items) == 1 and len(dates) == 1:
+            # Any other number or a period word could change the meaning, so leave those to the LLM
+            rest = self._RULE_DATE_RE.sub(' ', self._RULE_ITEM_RE.sub(' ', normalized_query))
+            if re.search(r'\d', rest) or self._RULE_NOT_PREDICTION_RE.search(rest):
+                return None
+            
+            year, month, day, dmy_day, dmy_month, dmy_year = dates[0].groups()
+            if year is None:
+                year, month, day = dmy_year, dmy_month, dmy_day
+            try:
+                date = datetime(int(year), int(month), int(day)).strftime('%Y-%m-%d')
+            except ValueError:
+                return None
+            
+            return {"query_type": "prediction", "item_id": int(items[0]), "date": date,
+                    "confidence": 1.0, "missing_info": []}
+        
+        # "Which was the most sold item in may", "most sold item in may 2024"
+        if not items and not dates and self._RULE_MOST_SOLD_RE.search(normalized_query):
+            months = self._RULE_MONTH_RE.findall(normalized_query)
+            years = self._RULE_YEAR_RE.findall(normalized_query)
+            if len(months) != 1 or len(years) > 1 or self._RULE_RELATIVE_RE.search(normalized_query):
+                return None
+            
+            month = _MONTHS[months[0]]
+            if years:
+                year = int(years[0])
+            else:
+                # Without a year, use the latest year the data has for that month
+                data_years = [y for y, m in self._sales_by_year_month if m == month]
+                if not data_years:
+                    return None
+                year = max(data_years)
+            
+            return {"query_type": "most_sold", "month": month, "year": year,
+                    "period_description": f"{calendar.month_name[month]} {year}",
+                    "confidence": 1.0, "missing_info": []}
+        
+        return None
+
     def find_most_sold_item(self, period: str = None, month: int = None, year: int = None) -> str:
         """
         Find the most sold item in a specific period
@@ -120,20 +463,20 @@ class SalesPredictionChatbot:
             return "Data not available for analysis."
             
         try:
-            df_filtered = self.df.copy()
+            # Use the totals precomputed at load time where possible
+            if month and year:
+                sales_by_item = self._sales_by_year_month.get((year, month))
+            elif year:
+                sales_by_item = self._sales_by_year.get(year)
+            elif not month:
+                sales_by_item = self._sales_total
+            else:
+                # Month without a year: sum the month's rows per item in one pass
+                sales_by_item = self._sum_by_item(self._months == month)
             
-            # Filter by month and year if specified
-            if month:
-                df_filtered = df_filtered[df_filtered['ORDERDATE'].dt.month == month]
-            if year:
-                df_filtered = df_filtered[df_filtered['ORDERDATE'].dt.year == year]
-            
-            if df_filtered.empty:
+            if sales_by_item is None:
                 return f"No data found for the specified period."
             
-            # Group by item and sum total sales
-            sales_by_item = df_filtered.groupby('ITEMID_Mapped')['TOTAL_ITEMSOLD'].sum().sort_values(ascending=False)
-            
             if sales_by_item.empty:
                 return "No sales data found for the specified period."
             
@@ -144,25 +487,28 @@ class SalesPredictionChatbot:
             top_5_items = sales_by_item.head(5)
             period_desc = f"May {year}" if month == 5 and year else "the specified period"
             
-            result = f"**Most Sold Item in {period_desc}:**\n"
-            result += f"🏆 **Item ID {top_item}** with **{int(total_sales)} total units sold**\n\n"
-            result += "**Top 5 Items:**\n"
-            for i, (item_id, sales) in enumerate(top_5_items.items(), 1):
-                result += f"{i}. Item {item_id}: {int(sales)} units\n"
+            # Collect the lines and join them once
+            lines = [
+                f"**Most Sold Item in {period_desc}:**",
+                f"🏆 **Item ID {top_item}** with **{int(total_sales)} total units sold**",
+                "",
+                "**Top 5 Items:**",
+            ]
+            lines.extend(f"{i}. Item {item_id}: {int(sales)} units" for i, (item_id, sales) in enumerate(top_5_items.items(), 1))
             
-            return result
+            return "\n".join(lines) + "\n"
             
         except Exception as e:
-            logger.error(f"Error in find_most_sold_item: {e}")
-            return f"Error analyzing sales data: {e}"
+            logger.error("Error in find_most_sold_item: %s", e)
+            return _FailedResponse(f"Error analyzing sales data: {e}")
 
-    def get_sales_summary(self, item_id: int = None, dates: List[str] = None) -> str:
+    def get_sales_summary(self, item_id: int = None, dates: Union[List[str], pd.DatetimeIndex] = None) -> str:
         """
         Get sales summary for specific item(s) and date(s)
         
         Args:
             item_id (int): Item ID to analyze
-            dates (List[str]): List of dates to analyze
+            dates (List[str] or pd.DatetimeIndex): Dates to analyze
             
         Returns:
             str: Sales summary
@@ -171,44 +517,58 @@ class SalesPredictionChatbot:
             return "Data not available for analysis."
             
         try:
-            df_filtered = self.df.copy()
+            # A DatetimeIndex has no truth value, so check the length instead
+            has_dates = dates is not None and len(dates) > 0
             
-            # Filter by item if specified
-            if item_id:
-                df_filtered = df_filtered[df_filtered['ITEMID_Mapped'] == item_id]
-            
-            # Filter by dates if specified
-            if dates:
-                date_objects = [pd.to_datetime(date) for date in dates]
-                df_filtered = df_filtered[df_filtered['ORDERDATE'].isin(date_objects)]
+            if item_id and has_dates:
+                # Look the requested days up in the per-item daily index.
+                # Days without a row are dropped, so the stats cover recorded days only.
+                date_objects = pd.to_datetime(dates).unique()
+                idx = pd.MultiIndex.from_product([[item_id], date_objects])
+                sales = self._daily.reindex(idx).dropna().to_numpy()
+            else:
+                # Filter by item or dates if specified, with one mask and a single slice
+                mask = np.ones(len(self.df), dtype=bool)
+                if item_id:
+                    mask &= self.df['ITEMID_Mapped'].to_numpy() == item_id
+                if has_dates:
+                    # Both sides as datetime64 arrays, so np.isin compares them with a sort-based lookup
+                    date_values = pd.to_datetime(dates).to_numpy(dtype=self.df['ORDERDATE'].dtype)
+                    mask &= np.isin(self.df['ORDERDATE'].to_numpy(), date_values)
+                sales = self.df.loc[mask, 'TOTAL_ITEMSOLD'].to_numpy()
             
-            if df_filtered.empty:
+            if len(sales) == 0:
                 return f"No data found for the specified criteria."
             
-            total_sales = df_filtered['TOTAL_ITEMSOLD'].sum()
-            avg_sales = df_filtered['TOTAL_ITEMSOLD'].mean()
-            max_sales = df_filtered['TOTAL_ITEMSOLD'].max()
-            min_sales = df_filtered['TOTAL_ITEMSOLD'].min()
+            total_sales = sales.sum()
+            avg_sales = sales.mean()
+            max_sales = sales.max()
+            min_sales = sales.min()
             
-            result = f"**Sales Summary:**\n"
+            # Collect the lines and join them once
+            lines = ["**Sales Summary:**"]
             if item_id:
-                result += f"Item ID: {item_id}\n"
-            if dates and len(dates) <= 5:
-                result += f"Dates: {', '.join(dates)}\n"
-            elif dates:
-                result += f"Date Range: {len(dates)} days\n"
+                lines.append(f"Item ID: {item_id}")
+            if has_dates and len(dates) <= 5:
+                date_strs = dates.strftime('%Y-%m-%d') if isinstance(dates, pd.DatetimeIndex) else dates
+                lines.append(f"Dates: {', '.join(date_strs)}")
+            elif has_dates:
+                lines.append(f"Date Range: {len(dates)} days")
             
-            result += f"\n📊 **Statistics:**\n"
-            result += f"• Total Sales: {int(total_sales)} units\n"
-            result += f"• Average Daily Sales: {avg_sales:.1f} units\n"
-            result += f"• Maximum Daily Sales: {int(max_sales)} units\n"
-            result += f"• Minimum Daily Sales: {int(min_sales)} units\n"
+            lines += [
+                "",
+                "📊 **Statistics:**",
+                f"• Total Sales: {int(total_sales)} units",
+                f"• Average Daily Sales: {avg_sales:.1f} units",
+                f"• Maximum Daily Sales: {int(max_sales)} units",
+                f"• Minimum Daily Sales: {int(min_sales)} units",
+            ]
             
-            return result
+            return "\n".join(lines) + "\n"
             
         except Exception as e:
-            logger.error(f"Error in get_sales_summary: {e}")
-            return f"Error analyzing sales data: {e}"
+            logger.error("Error in get_sales_summary: %s", e)
+            return _FailedResponse(f"Error analyzing sales data: {e}")
 
     def extract_parameters(self, user_query: str) -> Dict:
         """
@@ -221,96 +581,119 @@ class SalesPredictionChatbot:
             Dict: Extracted parameters with query type and relevant information
         """
         
-        system_prompt = f"""
-        You are a parameter extraction assistant for a sales prediction and analytics system.
-        
-        Available item IDs: {self.available_items}
-        Available date range: {self.date_range['min_date']} to {self.date_range['max_date']}
-        Current date: {datetime.now().strftime('%Y-%m-%d')}
-        
-        Analyze the user query and determine the query type and extract relevant parameters:
-        
-        QUERY TYPES:
-        1. "prediction" - User wants to predict sales for specific item and date
-        2. "analysis" - User wants to analyze historical sales data
-        3. "most_sold" - User wants to find the most sold item in a period
-        4. "summary" - User wants sales summary for item/period
-        
-        Extract these parameters:
-        - query_type: one of the above types
-        - item_id: integer (if specified)
-        - date: YYYY-MM-DD format (if single date)
-        - date_range: list of dates or period description
-        - month: month number (1-12) if mentioned
-        - year: year if mentioned
-        - period_description: natural description of time period
-        
-        For date formats:
-        - "4-5-2024" should be interpreted as 4th May 2024 (DD-MM-YYYY)
-        - "whole may" or "entire may" means all days in May
-        - "may 2024" means May 2024
-        - Handle relative dates like "tomorrow", "next week"
-        
-        Return ONLY a JSON object:
-        {{
-            "query_type": "<prediction|analysis|most_sold|summary>",
-            "item_id": <integer or null>,
-            "date": "<YYYY-MM-DD or null>",
-            "date_range": ["YYYY-MM-DD", ...] or null,
-            "month": <1-12 or null>,
-            "year": <year or null>,
-            "period_description": "<description or null>",
-            "confidence": <float between 0-1>,
-            "missing_info": ["list of missing required parameters"],
-            "clarification_needed": "<question to ask user if parameters unclear>"
-        }}
-        
-        Examples:
-        - "Predict sales for item 3 on 2024-05-01" → {{"query_type": "prediction", "item_id": 3, "date": "2024-05-01", "confidence": 1.0, "missing_info": []}}
-        - "Which was most sold item in may" → {{"query_type": "most_sold", "month": 5, "year": 2024, "period_description": "May 2024", "confidence": 0.9, "missing_info": []}}
-        - "Sales for item 2 whole may" → {{"query_type": "summary", "item_id": 2, "month": 5, "period_description": "whole May", "confidence": 0.9, "missing_info": []}}
-        - "on 4 may" → {{"query_type": "prediction", "date": "2024-05-04", "confidence": 0.7, "missing_info": ["item_id"], "clarification_needed": "Which item would you like to predict sales for on May 4th?"}}
-        - "4-5-2024" → {{"query_type": "prediction", "date": "2024-05-04", "confidence": 0.8, "missing_info": ["item_id"], "clarification_needed": "Which item would you like to predict sales for on May 4th, 2024?"}}
-        """
+        normalized_query = _normalize_query(user_query)
         
+        # Simple, self-contained queries are parsed locally without calling OpenAI
+        parameters = self._rule_extract(normalized_query)
+        if parameters is not None:
+            return parameters
+        
+        # Repeated queries are answered from the cache. Today's date is part of the key,
+        # so relative dates like "tomorrow" are re-extracted once the day changes.
+        # Only the last exchange is sent along, for follow-ups like "and for item 4?". It is
+        # part of the key too, but unlike the whole history it doesn't make every key unique.
+        today = datetime.now().strftime('%Y-%m-%d')
+        history = self._extraction_history()
+        key = self._extraction_key(normalized_query, today, history)
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_query}
-                ],
-                temperature=0.1,
-                max_tokens=400
-            )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Parse JSON response
-            try:
-                parameters = json.loads(content)
-                return parameters
-            except json.JSONDecodeError:
-                # Fallback: try to extract JSON from response
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    parameters = json.loads(json_match.group())
-                    return parameters
-                else:
-                    raise ValueError("Could not parse JSON from LLM response")
-                    
+            content = self._lookup_extraction(key)
+            if content is None:
+                content = self._extract_parameters_json(normalized_query, today, history)
+                self._store_extraction(key, content)
+            return json_loads(content)
         except Exception as e:
-            logger.error(f"Error in parameter extraction: {e}")
-            return {
-                "query_type": "prediction",
-                "item_id": None,
-                "date": None,
-                "confidence": 0.0,
-                "missing_info": ["item_id", "date"],
-                "clarification_needed": "I couldn't understand your request. Please specify the item ID and date for sales prediction."
-            }
-
-    def generate_response(self, prediction_result: str, user_query: str, parameters: Dict) -> str:
+            logger.error("Error in parameter extraction: %s", e)
+            return self._fallback_parameters()
+
+    @staticmethod
+    def _fallback_parameters() -> Dict:
+        """Parameters used when extraction fails; they make _respond ask the user to rephrase"""
+        return {
+            "query_type": "prediction",
+            "item_id": None,
+            "date": None,
+            "confidence": 0.0,
+            "missing_info": ["item_id", "date"],
+            "clarification_needed": "I couldn't understand your request. Please specify the item ID and date for sales prediction."
+        }
+
+    def _extraction_history(self) -> Tuple[Tuple[str, str], ...]:
+        """The last exchange as (role, content) pairs, sent with extraction requests and part of their key"""
+        return tuple((message["role"], message["content"])
+                     for message in self._history_snapshot(EXTRACTION_HISTORY_MESSAGES))
+
+    def _extraction_key(self, normalized_query: str, today: str,
+                        history: Tuple[Tuple[str, str], ...]) -> Tuple:
+        """Extraction cache key; the available items are part of it in case the data changes"""
+        return normalized_query, self._items_fingerprint, today, history
+
+    def _lookup_extraction(self, key: Tuple) -> Optional[str]:
+        """Return cached extraction JSON and mark it as recently used, or None"""
+        with self._lock:
+            content = self._extraction_cache.get(key)
+            if content is not None:
+                self._extraction_cache.move_to_end(key)
+            return content
+
+    def _store_extraction(self, key: Tuple, content: str):
+        """Cache extraction JSON, evicting the least recently used entry past EXTRACTION_CACHE_SIZE"""
+        with self._lock:
+            self._extraction_cache[key] = content
+            if len(self._extraction_cache) > EXTRACTION_CACHE_SIZE:
+                self._extraction_cache.popitem(last=False)
+
+    def _extract_parameters_json(self, normalized_query: str, today: str,
+                                 history: Tuple[Tuple[str, str], ...]) -> str:
+        """
+        Run the OpenAI extraction for a normalized query
+        
+        Args:
+            normalized_query (str): Lowercased, whitespace-collapsed user query
+            today (str): Current date in YYYY-MM-DD format
+            history (Tuple[Tuple[str, str], ...]): Earlier (role, content) chat messages
+            
+        Returns:
+            str: Extracted parameters as a JSON string, so cached values can't be mutated
+        """
+        
+        response = self.client.chat.completions.create(**self._extraction_request(normalized_query, today, history))
+        
+        # The forced function call always carries its arguments as a JSON object.
+        # Parse them here anyway, so a bad reply raises and is never cached.
+        arguments = response.choices[0].message.tool_calls[0].function.arguments
+        if not isinstance(json_loads(arguments), dict):
+            raise ValueError("Extraction arguments are not a JSON object")
+        
+        return arguments
+
+    def _extraction_request(self, normalized_query: str, today: str, history: Tuple[Tuple[str, str], ...]) -> Dict:
+        """Arguments for the extraction chat completion, shared by direct calls and run_batch"""
+        
+        # Messages are laid out as static prompt, history, then per-call context, so the static
+        # prompt and the history stay byte-identical and OpenAI's prefix cache can reuse them
+        context_prompt = (
+            f"Available item IDs: {self.available_items}\n"
+            f"Available date range: {self.date_range['min_date']} to {self.date_range['max_date']}\n"
+            f"Current date: {today}"
+        )
+        
+        return dict(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": EXTRACTION_PROMPT},
+                *({"role": role, "content": content} for role, content in history),
+                {"role": "system", "content": context_prompt},
+                {"role": "user", "content": normalized_query}
+            ],
+            tools=[EXTRACTION_TOOL],
+            tool_choice={"type": "function", "function": {"name": "extract_sales_query"}},
+            temperature=0,
+            max_tokens=400,
+            extra_body={"prompt_cache_key": EXTRACTION_CACHE_KEY}
+        )
+
+    def generate_response(self, prediction_result: str, user_query: str, parameters: Dict,
+                          stream: bool = False) -> Union[str, Iterator[str]]:
         """
         Generate a natural language response based on prediction results
         
@@ -318,45 +701,85 @@ class SalesPredictionChatbot:
             prediction_result (str): Result from the prediction model
             user_query (str): Original user query
             parameters (Dict): Extracted parameters
+            stream (bool): Return an iterator over the response text as it is generated
             
         Returns:
-            str: Natural language response
+            str or Iterator[str]: Natural language response, or its chunks when streaming;
+                the iterator returns the whole response like _stream_response
         """
         
-        system_prompt = f"""
-        You are a helpful sales prediction assistant. Generate a natural, conversational response based on the prediction results.
-        
-        User's original query: "{user_query}"
-        Extracted parameters: Item ID {parameters.get('item_id')}, Date {parameters.get('date')}
-        Prediction result: "{prediction_result}"
+        request = self._response_request(prediction_result, user_query, parameters)
         
-        Guidelines:
-        1. Be conversational and helpful
-        2. Explain the prediction clearly
-        3. Mention both actual and predicted values if available
-        4. Add context about the prediction (e.g., if it's higher/lower than actual)
-        5. Offer to help with more predictions
-        6. Keep it concise but informative
-        
-        Avoid technical jargon and make it user-friendly.
-        """
+        if stream:
+            return self._stream_response(request, prediction_result)
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Generate response for: {prediction_result}"}
-                ],
-                temperature=0.7,
-                max_tokens=200
-            )
+            response = self.client.chat.completions.create(**request)
             
             return response.choices[0].message.content.strip()
             
         except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            return f"Here are your prediction results: {prediction_result}"
+            logger.error("Error generating response: %s", e)
+            return _FailedResponse(f"Here are your prediction results: {prediction_result}")
+
+    @staticmethod
+    def _response_context(prediction_result: str, user_query: str, parameters: Dict) -> str:
+        """Per-call context message describing one prediction to respond to"""
+        return (
+            f"User's original query: \"{user_query}\"\n"
+            f"Extracted parameters: Item ID {parameters.get('item_id')}, Date {parameters.get('date')}\n"
+            f"Prediction result: \"{prediction_result}\""
+        )
+
+    def _response_request(self, prediction_result: str, user_query: str, parameters: Dict) -> Dict:
+        """
+        Arguments for the response chat completion, shared by direct calls, packed requests
+        and run_batch. The last two messages are the per-call context and instruction.
+        """
+        return dict(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": RESPONSE_PROMPT},
+                *self._history_snapshot(),
+                {"role": "system", "content": self._response_context(prediction_result, user_query, parameters)},
+                {"role": "user", "content": f"Generate response for: {prediction_result}"}
+            ],
+            temperature=0.7,
+            max_tokens=200
+        )
+
+    def _stream_response(self, request: Dict, prediction_result: str) -> Iterator[str]:
+        """
+        Yield the response text chunk by chunk as the model generates it. The generator
+        returns the whole response, as a _FailedResponse if the stream failed.
+        """
+        chunks = []
+        stream = None
+        try:
+            stream = self.client.chat.completions.create(**request, stream=True)
+            
+            for chunk in stream:
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if content:
+                    chunks.append(content)
+                    yield content
+            
+        except Exception as e:
+            logger.error("Error generating response: %s", e)
+            # Text already shown can't be taken back, so a cut-off response is marked as such
+            if chunks:
+                tail = "\n\n⚠️ The response was interrupted."
+            else:
+                tail = f"Here are your prediction results: {prediction_result}"
+            chunks.append(tail)
+            yield tail
+            return _FailedResponse("".join(chunks).strip())
+        finally:
+            # Also reached when the caller stops early, which drops the HTTP connection
+            if stream is not None:
+                stream.close()
+        
+        return "".join(chunks).strip()
 
     def handle_query(self, user_query: str) -> str:
         """
@@ -369,11 +792,414 @@ class SalesPredictionChatbot:
             str: Generated response
         """
         
-        logger.info(f"Processing query: {user_query}")
+        logger.info("Processing query: %s", user_query)
         
         # Extract parameters from query
         parameters = self.extract_parameters(user_query)
         
+        response = self._cached_respond(user_query, parameters)
+        self._add_to_history(user_query, response)
+        return response
+
+    async def ahandle_query(self, user_query: str) -> str:
+        """
+        Async version of handle_query, so several queries can wait on OpenAI at once.
+        The query runs in a worker thread; queries running at the same time don't
+        see each other's exchanges in the chat history.
+        
+        Args:
+            user_query (str): User's natural language query
+            
+        Returns:
+            str: Generated response
+        """
+        return await asyncio.to_thread(self.handle_query, user_query)
+
+    def handle_query_stream(self, user_query: str) -> Iterator[str]:
+        """
+        Handle a user query like handle_query, yielding the response as it is generated.
+        Only prediction responses come from the model in several chunks; the others are
+        computed locally and yielded whole. Closing the generator early stops the model
+        stream, and the partial response is not cached.
+        
+        Args:
+            user_query (str): User's natural language query
+            
+        Yields:
+            str: Chunks of the generated response
+        """
+        
+        logger.info("Processing query: %s", user_query)
+        
+        # Extract parameters from query
+        parameters = self.extract_parameters(user_query)
+        
+        response = self._lookup_response(user_query, parameters)
+        if response is not None:
+            yield response
+        else:
+            prediction_result = self._predict_target(parameters)
+            result = self._respond(user_query, parameters, prediction_result, stream=True)
+            if isinstance(result, str):
+                response = result
+                yield response
+            else:
+                # A stream that failed returns a _FailedResponse, which is not cached
+                response = yield from result
+            self._store_response(user_query, parameters, response, prediction_result)
+        
+        self._add_to_history(user_query, response)
+
+    def handle_queries(self, user_queries: List[str], packed: bool = False) -> List[str]:
+        """
+        Handle several queries, running all of their predictions in one model call
+        
+        Args:
+            user_queries (List[str]): User's natural language queries
+            packed (bool): Also extract all parameters in one OpenAI request and write all
+                prediction responses in another, instead of one request per query
+            
+        Returns:
+            List[str]: Generated responses, in the same order as the queries
+        """
+        
+        if packed:
+            return self._respond_all(user_queries, self._extract_parameters_packed(user_queries),
+                                     self._generate_responses_packed)
+        
+        parameters_list = [self.extract_parameters(user_query) for user_query in user_queries]
+        
+        predictions = self._predict_targets(parameters_list)
+        
+        responses = [
+            self._cached_respond(user_query, parameters, predictions.get(self._prediction_target(parameters)))
+            for user_query, parameters in zip(user_queries, parameters_list)
+        ]
+        
+        for user_query, response in zip(user_queries, responses):
+            self._add_to_history(user_query, response)
+        
+        return responses
+
+    def _extract_parameters_packed(self, user_queries: List[str]) -> List[Dict]:
+        """
+        Extract the parameters of several queries with one OpenAI request. Queries the rules
+        handle are parsed locally and cached ones come from the extraction cache, which the
+        packed results are added to; they see the same last exchange as extract_parameters.
+        If the reply doesn't line up with the queries, each one falls back to extract_parameters.
+        """
+        normalized_queries = [_normalize_query(user_query) for user_query in user_queries]
+        parameters_list = [self._rule_extract(normalized_query) for normalized_query in normalized_queries]
+        
+        today = datetime.now().strftime('%Y-%m-%d')
+        history = self._extraction_history()
+        keys = {i: self._extraction_key(normalized_query, today, history)
+                for i, normalized_query in enumerate(normalized_queries) if parameters_list[i] is None}
+        for i, key in keys.items():
+            content = self._lookup_extraction(key)
+            if content is not None:
+                parameters_list[i] = json_loads(content)
+        pending = [i for i in keys if parameters_list[i] is None]
+        
+        # A single query gains nothing from packing and goes through the cached path instead
+        if len(pending) > 1:
+            numbered = "\n".join(f"{n}. {normalized_queries[i]}" for n, i in enumerate(pending, 1))
+            packed_query = (f"Extract the parameters of each of these {len(pending)} queries separately and "
+                            f"call extract_sales_queries with one entry per query, in the same order:\n{numbered}")
+            
+            request = self._extraction_request(packed_query, today, history)
+            request.update(tools=[EXTRACTION_LIST_TOOL],
+                           tool_choice={"type": "function", "function": {"name": "extract_sales_queries"}},
+                           max_tokens=400 * len(pending))
+            try:
+                response = self.client.chat.completions.create(**request)
+                extracted = json_loads(response.choices[0].message.tool_calls[0].function.arguments)["queries"]
+                if len(extracted) != len(pending) or not all(isinstance(p, dict) for p in extracted):
+                    raise ValueError(f"Expected {len(pending)} parameter sets, got {len(extracted)}")
+                for i, parameters in zip(pending, extracted):
+                    parameters_list[i] = parameters
+                    self._store_extraction(keys[i], json.dumps(parameters))
+            except Exception as e:
+                logger.error("Error in packed parameter extraction: %s", e)
+        
+        return [parameters if parameters is not None else self.extract_parameters(user_query)
+                for user_query, parameters in zip(user_queries, parameters_list)]
+
+    def _generate_responses_packed(self, items: Dict[int, Tuple[str, str, Dict]]) -> Dict[int, str]:
+        """
+        Write the responses for several predictions with one OpenAI request.
+        items maps a position to (prediction_result, user_query, parameters). If the reply
+        doesn't line up with the items, each one falls back to generate_response.
+        """
+        if len(items) == 1:
+            (i, item), = items.items()
+            return {i: self.generate_response(*item)}
+        
+        context_prompt = "\n\n".join(
+            f"{n}. {self._response_context(*item)}" for n, item in enumerate(items.values(), 1)
+        )
+        
+        # Same request as a single response, with all the predictions in the context message
+        request = self._response_request(*next(iter(items.values())))
+        request["messages"][-2:] = [
+            {"role": "system", "content": context_prompt},
+            {"role": "user", "content": f"Generate a separate response for each of the {len(items)} "
+                                        f"prediction results above and call write_responses with them, in order"}
+        ]
+        request.update(tools=[RESPONSES_TOOL],
+                       tool_choice={"type": "function", "function": {"name": "write_responses"}},
+                       max_tokens=200 * len(items))
+        try:
+            response = self.client.chat.completions.create(**request)
+            texts = json_loads(response.choices[0].message.tool_calls[0].function.arguments)["responses"]
+            if len(texts) != len(items):
+                raise ValueError(f"Expected {len(items)} responses, got {len(texts)}")
+            return {i: str(text).strip() for i, text in zip(items, texts)}
+        except Exception as e:
+            logger.error("Error in packed response generation: %s", e)
+            return {i: self.generate_response(*item) for i, item in items.items()}
+
+    def run_batch(self, user_queries: List[str], poll_interval: float = 30.0) -> List[str]:
+        """
+        Answer several independent queries through the OpenAI Batch API, which costs half
+        as much as direct calls but may take up to 24 hours. Meant for non-interactive runs.
+        Extraction and response generation each go out as one batch job; the queries don't
+        see each other or the earlier chat history.
+        
+        Args:
+            user_queries (List[str]): User's natural language queries
+            poll_interval (float): Seconds between batch status checks
+            
+        Returns:
+            List[str]: Generated responses, in the same order as the queries
+        """
+        
+        # Parse what the rules can locally, send the rest to the model as one job
+        today = datetime.now().strftime('%Y-%m-%d')
+        normalized_queries = [_normalize_query(user_query) for user_query in user_queries]
+        parameters_list = [self._rule_extract(normalized_query) for normalized_query in normalized_queries]
+        requests = {
+            f"extract-{i}": self._extraction_request(normalized_query, today, ())
+            for i, (normalized_query, parameters) in enumerate(zip(normalized_queries, parameters_list))
+            if parameters is None
+        }
+        results = self._run_batch_job(requests, poll_interval) if requests else {}
+        for custom_id in requests:
+            i = int(custom_id.split('-')[1])
+            try:
+                arguments = results[custom_id]["choices"][0]["message"]["tool_calls"][0]["function"]["arguments"]
+                parameters_list[i] = json_loads(arguments)
+            except Exception as e:
+                logger.error("Error in parameter extraction: %s", e)
+                parameters_list[i] = self._fallback_parameters()
+        
+        # Prediction responses come from the model, again as one job
+        return self._respond_all(user_queries, parameters_list,
+                                 lambda items: self._generate_responses_batch(items, poll_interval))
+
+    def _generate_responses_batch(self, items: Dict[int, Tuple[str, str, Dict]], poll_interval: float) -> Dict[int, str]:
+        """Write the responses for several predictions as one Batch API job; failed items are left out"""
+        requests = {f"respond-{i}": self._response_request(*item) for i, item in items.items()}
+        results = self._run_batch_job(requests, poll_interval)
+        
+        responses = {}
+        for i in items:
+            try:
+                responses[i] = results[f"respond-{i}"]["choices"][0]["message"]["content"].strip()
+            except Exception as e:
+                logger.error("Error generating response: %s", e)
+        return responses
+
+    def _respond_all(self, user_queries: List[str], parameters_list: List[Dict],
+                     generate: Callable[[Dict[int, Tuple[str, str, Dict]]], Dict[int, str]]) -> List[str]:
+        """
+        Respond to several queries whose parameters are already extracted, writing all
+        prediction responses with a single call to generate. generate gets a dict mapping
+        positions to (prediction_result, user_query, parameters) and returns the texts by
+        position; missing ones fall back like generate_response does.
+        """
+        predictions = self._predict_targets(parameters_list)
+        
+        responses = [None] * len(user_queries)
+        pending = {}
+        pending_keys = {}  # response cache key -> position in pending, so repeats are generated once
+        for i, (user_query, parameters) in enumerate(zip(user_queries, parameters_list)):
+            target = self._prediction_target(parameters)
+            key = self._response_key(user_query, parameters)
+            responses[i] = self._lookup_response(user_query, parameters)
+            if responses[i] is None and target is not None:
+                if pending_keys.setdefault(key, i) == i:
+                    pending[i] = (predictions[target], user_query, parameters)
+            elif responses[i] is None:
+                # Not a model prediction, so the response is computed locally
+                responses[i] = self._cached_respond(user_query, parameters)
+        
+        generated = generate(pending) if pending else {}
+        for i, (prediction_result, user_query, parameters) in pending.items():
+            response = generated.get(i) or _FailedResponse(f"Here are your prediction results: {prediction_result}")
+            self._record_prediction(user_query, parameters, prediction_result, response)
+            self._store_response(user_query, parameters, response, prediction_result)
+            responses[i] = response
+        
+        # Repeats of a query generated above share its response, and are recorded like cache hits
+        for i, (user_query, parameters) in enumerate(zip(user_queries, parameters_list)):
+            if responses[i] is None:
+                j = pending_keys[self._response_key(user_query, parameters)]
+                responses[i] = responses[j]
+                self._record_prediction(user_query, parameters, pending[j][0], responses[i])
+        
+        for user_query, response in zip(user_queries, responses):
+            self._add_to_history(user_query, response)
+        
+        return responses
+
+    def _run_batch_job(self, requests: Dict[str, Dict], poll_interval: float) -> Dict[str, Dict]:
+        """
+        Submit chat completion requests as one Batch API job and wait for it to finish.
+        Returns the response bodies of the successful requests, keyed by custom_id.
+        """
+        lines = []
+        for custom_id, request in requests.items():
+            # extra_body fields are plain top-level fields in a batch request body
+            body = {key: value for key, value in request.items() if key != 'extra_body'}
+            body.update(request.get('extra_body', {}))
+            lines.append(json.dumps({"custom_id": custom_id, "method": "POST",
+                                     "url": "/v1/chat/completions", "body": body}))
+        
+        batch_file = self.client.files.create(file=("requests.jsonl", "\n".join(lines).encode()), purpose="batch")
+        batch = self.client.batches.create(input_file_id=batch_file.id, endpoint="/v1/chat/completions",
+                                           completion_window="24h")
+        logger.info("Submitted batch %s with %d requests", batch.id, len(lines))
+        
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(poll_interval)
+            batch = self.client.batches.retrieve(batch.id)
+        
+        if batch.status != "completed":
+            raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+        
+        results = {}
+        if batch.output_file_id:
+            for line in self.client.files.content(batch.output_file_id).text.splitlines():
+                record = json_loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[record["custom_id"]] = response["body"]
+        return results
+
+    def _prediction_target(self, parameters: Dict) -> Optional[Tuple[int, str]]:
+        """(item_id, date) for a query that _respond answers with a model prediction, or None"""
+        if parameters.get('confidence', 0) < 0.5 or parameters.get('missing_info'):
+            return None
+        if parameters.get('query_type', 'prediction') != 'prediction':
+            return None
+        
+        item_id = parameters.get('item_id')
+        date = parameters.get('date')
+        if item_id not in self.available_items or not date:
+            return None
+        try:
+            datetime.strptime(date, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return None
+        return item_id, date
+
+    def _predict_targets(self, parameters_list: List[Dict]) -> Dict[Tuple[int, str], str]:
+        """Run the predictions for all queries that need one in a single model call"""
+        targets = list(dict.fromkeys(filter(None, map(self._prediction_target, parameters_list))))
+        if not targets:
+            return {}
+        item_ids, dates = zip(*targets)
+        return dict(zip(targets, predict_sales_batch(item_ids, dates)))
+
+    def _history_snapshot(self, messages: Optional[int] = None) -> List[Dict]:
+        """
+        Copy of the chat history, or of its last messages, taken under the lock so that
+        queries running in other threads can't change it while a request is built
+        """
+        with self._lock:
+            return self.message_history[-messages:] if messages else list(self.message_history)
+
+    def _add_to_history(self, user_query: str, response: str):
+        """Append a finished exchange to the chat history and drop the oldest ones past MAX_HISTORY_TOKENS"""
+        with self._lock:
+            self.message_history.append({"role": "user", "content": user_query})
+            self.message_history.append({"role": "assistant", "content": response})
+            
+            while len(self.message_history) > 2 and _estimate_tokens(self.message_history) > MAX_HISTORY_TOKENS:
+                del self.message_history[:2]
+
+    def _cached_respond(self, user_query: str, parameters: Dict, prediction_result: Optional[str] = None) -> str:
+        """
+        Return the cached response for a repeated query, or build and cache a new one.
+        The extracted parameters are part of the key, so follow-ups that depend on the
+        history and relative dates like "tomorrow" only match when they resolve the same way.
+        """
+        response = self._lookup_response(user_query, parameters)
+        if response is None:
+            if prediction_result is None:
+                prediction_result = self._predict_target(parameters)
+            response = self._respond(user_query, parameters, prediction_result)
+            self._store_response(user_query, parameters, response, prediction_result)
+        return response
+
+    def _predict_target(self, parameters: Dict) -> Optional[str]:
+        """Prediction result for a query that _respond answers with a model prediction, or None"""
+        target = self._prediction_target(parameters)
+        return predict_sales(*target) if target is not None else None
+
+    @staticmethod
+    def _response_key(user_query: str, parameters: Dict) -> Tuple[str, str]:
+        """Response cache key for a query and its extracted parameters"""
+        return _normalize_query(user_query), json.dumps(parameters, sort_keys=True)
+
+    def _lookup_response(self, user_query: str, parameters: Dict) -> Optional[str]:
+        """
+        Return a cached response and mark it as recently used, or None. A repeated
+        prediction is added to conversation_history again, like a freshly answered one.
+        """
+        key = self._response_key(user_query, parameters)
+        with self._lock:
+            entry = self._response_cache.get(key)
+            if entry is None:
+                return None
+            self._response_cache.move_to_end(key)
+        
+        response, prediction_result = entry
+        if prediction_result is not None:
+            self._record_prediction(user_query, parameters, prediction_result, response)
+        return response
+
+    def _store_response(self, user_query: str, parameters: Dict, response: str,
+                        prediction_result: Optional[str] = None):
+        """
+        Cache a response along with its prediction result, if any, evicting the least
+        recently used one past RESPONSE_CACHE_SIZE. Responses written after an error
+        are not cached, so the next identical query tries again.
+        """
+        if isinstance(response, _FailedResponse):
+            return
+        key = self._response_key(user_query, parameters)
+        with self._lock:
+            self._response_cache[key] = (response, prediction_result)
+            if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+
+    def _respond(self, user_query: str, parameters: Dict, prediction_result: Optional[str] = None,
+                 stream: bool = False) -> Union[str, Iterator[str]]:
+        """
+        Build the response for a query whose parameters have already been extracted
+        
+        Args:
+            user_query (str): User's natural language query
+            parameters (Dict): Extracted parameters
+            prediction_result (Optional[str]): Precomputed prediction, if already available
+            stream (bool): Return prediction responses as an iterator over their chunks
+            
+        Returns:
+            str or Iterator[str]: Generated response; an iterator only for streamed predictions
+        """
+        
         # Check confidence and missing information
         if parameters.get('confidence', 0) < 0.5 or parameters.get('missing_info'):
             return parameters.get('clarification_needed', 
@@ -401,7 +1227,7 @@ class SalesPredictionChatbot:
                 dates = None
                 if month and year:
                     days_in_month = calendar.monthrange(year, month)[1]
-                    dates = [f"{year}-{month:02d}-{day:02d}" for day in range(1, days_in_month + 1)]
+                    dates = pd.date_range(f"{year}-{month:02d}-01", periods=days_in_month, freq='D')
                 elif parameters.get('date'):
                     dates = [parameters.get('date')]
                 
@@ -414,7 +1240,7 @@ class SalesPredictionChatbot:
                 
                 if month and year:
                     days_in_month = calendar.monthrange(year, month)[1]
-                    dates = [f"{year}-{month:02d}-{day:02d}" for day in range(1, days_in_month + 1)]
+                    dates = pd.date_range(f"{year}-{month:02d}-01", periods=days_in_month, freq='D')
                     return self.get_sales_summary(item_id=item_id, dates=dates)
                 else:
                     return "Please specify a time period for analysis."
@@ -436,28 +1262,47 @@ class SalesPredictionChatbot:
                 except ValueError:
                     return f"Invalid date format. Please use YYYY-MM-DD format."
                 
-                # Run prediction
-                prediction_result = predict_sales(item_id, date)
+                # Run prediction unless it was already computed in a batch
+                if prediction_result is None:
+                    prediction_result = predict_sales(item_id, date)
                 
                 # Generate natural language response
+                if stream:
+                    return self._stream_prediction(user_query, parameters, prediction_result)
                 response = self.generate_response(prediction_result, user_query, parameters)
                 
                 # Add to conversation history
-                self.conversation_history.append({
-                    'query': user_query,
-                    'parameters': parameters,
-                    'result': prediction_result,
-                    'response': response
-                })
+                self._record_prediction(user_query, parameters, prediction_result, response)
                 
                 return response
                 
         except Exception as e:
-            logger.error(f"Error processing query: {e}")
-            return f"I encountered an error while processing your request: {str(e)}"
+            logger.error("Error processing query: %s", e)
+            return _FailedResponse(f"I encountered an error while processing your request: {str(e)}")
+
+    def _stream_prediction(self, user_query: str, parameters: Dict, prediction_result: str) -> Iterator[str]:
+        """Yield a prediction response as it is generated, then record and return it like _respond does"""
+        response = yield from self.generate_response(prediction_result, user_query, parameters, stream=True)
+        
+        # Add to conversation history
+        self._record_prediction(user_query, parameters, prediction_result, response)
+        return response
+
+    def _record_prediction(self, user_query: str, parameters: Dict, prediction_result: str, response: str):
+        """Add an answered prediction to conversation_history"""
+        self.conversation_history.append({
+            'query': user_query,
+            'parameters': parameters,
+            'result': prediction_result,
+            'response': response
+        })
 
     def get_help_message(self) -> str:
         """Return help message for users"""
+        return self._help_message
+
+    def _build_help_message(self) -> str:
+        """Format the help message from the loaded data context"""
         return f"""
         🤖 **AI Sales Agent Help**
         
@@ -548,4 +1393,5 @@ def main():
             continue
 
 if __name__ == "__main__":
+    configure_logging()
     main()
@@ -1,11 +1,17 @@
 import streamlit as st
+import openai
 import os
-from sales_chatbot import SalesPredictionChatbot
+import html
+import itertools
+from sales_chatbot import SalesPredictionChatbot, configure_logging
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Configure logging from the environment (LOG_LEVEL, default WARNING)
+configure_logging("WARNING")
+
 # Simple page configuration
 st.set_page_config(
     page_title="Sales Prediction Chatbot",
@@ -73,6 +79,11 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource(show_spinner=False)
+def _load_client(api_key):
+    """Create the OpenAI client once per server process; it holds no conversation state"""
+    return openai.OpenAI(api_key=api_key)
+
 def initialize_chatbot():
     """Initialize the chatbot with API key"""
     api_key = os.getenv('OPENAI_API_KEY')
@@ -80,8 +91,14 @@ def initialize_chatbot():
     if not api_key or api_key == 'your-openai-api-key-here':
         return None
     
+    # One chatbot per browser session, since it holds the session's chat history and
+    # cached replies; the sales data and the OpenAI client are shared between sessions
+    if 'chatbot' in st.session_state:
+        return st.session_state.chatbot
+    
     try:
-        chatbot = SalesPredictionChatbot(api_key)
+        chatbot = SalesPredictionChatbot(api_key, client=_load_client(api_key))
+        st.session_state.chatbot = chatbot
         return chatbot
     except Exception as e:
         st.error(f"Error initializing chatbot: {e}")
@@ -107,18 +124,22 @@ def main():
     # Display chat messages
     for message in st.session_state.messages:
         if message["role"] == "user":
-            st.markdown(f'<div class="chat-message user-message"><strong>You:</strong> {message["content"]}</div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="chat-message user-message"><strong>You:</strong> {html.escape(message["content"])}</div>', unsafe_allow_html=True)
         else:
-            st.markdown(f'<div class="chat-message bot-message"><strong>Bot:</strong> {message["content"]}</div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="chat-message bot-message"><strong>Bot:</strong> {html.escape(message["content"])}</div>', unsafe_allow_html=True)
     
     # Chat input
     if prompt := st.chat_input("Ask about sales predictions..."):
         # Add user message
         st.session_state.messages.append({"role": "user", "content": prompt})
         
-        # Get bot response
+        # Show the question right away, then stream the answer as it is generated
+        st.markdown(f'<div class="chat-message user-message"><strong>You:</strong> {html.escape(prompt)}</div>', unsafe_allow_html=True)
+        # Spin only until the first chunk arrives, so it doesn't sit over the streamed text
+        stream = chatbot.handle_query_stream(prompt)
         with st.spinner("Thinking..."):
-            response = chatbot.handle_query(prompt)
+            first_chunk = next(stream, "")
+        response = st.write_stream(itertools.chain([first_chunk], stream))
         
         # Add bot response
         st.session_state.messages.append({"role": "assistant", "content": response})
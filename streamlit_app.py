@@ -1,14 +1,41 @@
 import streamlit as st
+import html
+import openai
 import os
-from sales_chatbot import SalesPredictionChatbot
-import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final
+from sales_chatbot import SalesPredictionChatbot, configure_logging
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging from the environment (LOG_LEVEL, default WARNING)
+configure_logging("WARNING")
+
+# Only the most recent messages are rendered until the user asks for the rest
+HISTORY_WINDOW = 40
+
+# Seconds between checks on a reply that is being generated in the background
+REPLY_POLL_INTERVAL = 0.1
+
+# Sidebar help text, built once at import instead of on every main() call
+HELP_MD: Final[str] = """
+**I can help you with:**
+
+🔮 **Sales Predictions:**
+- 'Predict sales for item 3 on 2024-05-01'
+- 'Sales for item 2 on 4-5-2024'
+
+
+
+🏆 **Top Performers:**
+- 'Most sold item in May 2024'
+
+**Date formats:** YYYY-MM-DD, DD-MM-YYYY, 'whole May', etc.
+"""
 
 # Streamlit page configuration
 st.set_page_config(
@@ -19,153 +46,101 @@ st.set_page_config(
 )
 
 # --- Custom CSS for the new UI ---
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
-    
-    body {
-        font-family: 'Inter', sans-serif;
-    }
-
-    /* Main container styling */
-    .stApp {
-        background-color: #f3f4f6; /* gray-100 */
-    }
-
-    /* Hide default streamlit elements */
-    #MainMenu, footer, .stDeployButton, .stHeader {
-        display: none;
-    }
-    
-    /* Force remove top padding from Streamlit's main container */
-    .block-container {
-        padding-top: 1rem !important; 
-        padding-bottom: 2rem !important;
-        padding-left: 1rem !important;
-        padding-right: 1rem !important;
-    }
-
-    /* Target the specific element that adds the top margin */
-    div[data-testid="stVerticalBlock"] > [style*="gap: 1rem;"] {
-        gap: 0 !important;
-    }
-
-    /* New App Header at the top of the page */
-    .app-header {
-        background: linear-gradient(135deg, #4f46e5 0%, #7c3aed 100%);
-        color: white;
-        padding: 2rem;
-        text-align: center;
-        border-radius: 1rem 1rem 0 0; /* Rounded top corners only */
-        margin-bottom: 0; /* REMOVED margin to connect to chat wrapper */
-        box-shadow: 0 10px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-    }
-    
-    .app-header h1 {
-        font-size: 2.5rem;
-        font-weight: 700;
-        margin: 0;
-    }
-    
-    .app-header p {
-        font-size: 1rem;
-        opacity: 0.8;
-        margin-top: 0.5rem;
-    }
-
-    /* Chat container styling (no header inside) */
-    .chat-wrapper {
-        background: white;
-        border-radius: 0 0 1rem 1rem; /* Rounded bottom corners only */
-        box-shadow: 0 10px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-        max-width: 800px;
-        margin: 0 auto; /* REMOVED top margin */
-        height: 70vh;
-        display: flex;
-        flex-direction: column;
-    }
-
-    .chat-history {
-        flex-grow: 1;
-        padding: 1.5rem;
-        overflow-y: auto;
-        display: flex;
-        flex-direction: column;
-        gap: 1rem;
-    }
-
-    .chat-message {
-        display: flex;
-        width: 100%;
-    }
-
-    .chat-bubble {
-        max-width: 75%;
-        padding: 0.75rem 1rem;
-        border-radius: 1.25rem;
-        word-wrap: break-word;
-    }
-
-    .user-message {
-        justify-content: flex-end;
-    }
-    
-    .user-bubble {
-        background-color: #3b82f6; /* blue-500 */
-        color: white;
-        border-bottom-right-radius: 0.25rem;
-    }
-
-    .bot-message {
-        justify-content: flex-start;
-    }
-
-    .bot-bubble {
-        background-color: #e5e7eb; /* gray-200 */
-        color: #1f2937; /* gray-800 */
-        border-bottom-left-radius: 0.25rem;
-    }
-    
-    /* Input area styling */
-    .input-section {
-        padding: 1rem 1.5rem;
-        border-top: 1px solid #e5e7eb;
-    }
-
-    .stTextInput > div > div > input {
-        border-radius: 9999px;
-        border: 1px solid #d1d5db;
-        padding: 0.75rem 1rem;
-    }
-    .stTextInput > div > div > input:focus {
-        border-color: #4f46e5;
-        box-shadow: 0 0 0 2px rgba(79, 70, 229, 0.2);
-    }
-    
-    .stButton > button {
-        border-radius: 9999px;
-        border: none;
-        background-color: #4f46e5;
-        color: white;
-        padding: 0.75rem 1.5rem;
-        width: 100%;
-    }
-    .stButton > button:hover {
-        background-color: #4338ca;
-    }
-</style>
-""", unsafe_allow_html=True)
+# The stylesheet is served as a static file, so the browser caches it and
+# reruns only send this link instead of the whole block. Streamlit 1.57+ serves it as
+# text/css; older releases sent .css static files as text/plain, which browsers ignore.
+st.markdown('<link rel="stylesheet" href="app/static/app.css">', unsafe_allow_html=True)
+
+def user_bubble(content):
+    """HTML for a user chat bubble, with the message text escaped"""
+    return f'<div class="chat-message user-message"><div class="chat-bubble user-bubble">{html.escape(content)}</div></div>'
+
+def bot_bubble(content):
+    """HTML for a bot chat bubble, with the message text escaped"""
+    return f'<div class="chat-message bot-message"><div class="chat-bubble bot-bubble">{html.escape(content)}</div></div>'
+
+def make_message(role, content):
+    """Chat history entry with its bubble HTML rendered once, so reruns only join stored strings"""
+    bubble = user_bubble if role == "user" else bot_bubble
+    return {"role": role, "content": content, "html": bubble(content)}
+
+def _generate_reply(chatbot, user_input, chunks, cancel):
+    """Worker thread: collect the streamed reply into chunks until it ends or is cancelled"""
+    stream = chatbot.handle_query_stream(user_input)
+    try:
+        for chunk in stream:
+            if cancel.is_set():
+                break
+            chunks.append(chunk)
+    finally:
+        # Closing the generator also closes the OpenAI stream
+        stream.close()
+    return "".join(chunks)
+
+def start_reply(chatbot, user_input):
+    """Generate the reply on the session's worker thread and return its pending state"""
+    if 'reply_executor' not in st.session_state:
+        st.session_state['reply_executor'] = ThreadPoolExecutor(max_workers=1)
+    chunks, cancel = [], threading.Event()
+    future = st.session_state['reply_executor'].submit(_generate_reply, chatbot, user_input, chunks, cancel)
+    pending = {"id": len(st.session_state.messages), "future": future, "chunks": chunks, "cancel": cancel}
+    st.session_state['pending_reply'] = pending
+    return pending
+
+def await_reply(pending):
+    """
+    Show a pending reply as it streams in, with a Cancel button, and add it to
+    the chat history once it is done. The script thread only polls, so a click
+    interrupts the wait instead of queueing behind the OpenAI call.
+    """
+    placeholder = st.empty()
+    controls = st.empty()
+    future = pending["future"]
+    if controls.button("⏹ Cancel", key=f"cancel_reply_{pending['id']}"):
+        pending["cancel"].set()
+        # The worker may still be stuck waiting on OpenAI before it sees the
+        # event; retire its executor so the next query gets a free thread.
+        st.session_state.pop('reply_executor').shutdown(wait=False, cancel_futures=True)
+        bot_response = "".join(pending["chunks"]) + "\n\n⏹ Cancelled."
+    else:
+        while not future.done():
+            placeholder.markdown(bot_bubble("".join(pending["chunks"]) or "🤖 Thinking..."), unsafe_allow_html=True)
+            time.sleep(REPLY_POLL_INTERVAL)
+        try:
+            bot_response = future.result()
+        except Exception as e:
+            bot_response = f"Sorry, an error occurred: {e}"
+    controls.empty()
+    message = make_message("bot", bot_response.strip())
+    placeholder.markdown(message["html"], unsafe_allow_html=True)
+    st.session_state.messages.append(message)
+    del st.session_state['pending_reply']
+
+@st.cache_resource(show_spinner=False)
+def _get_client(api_key: str):
+    """Create the OpenAI client once per API key; it holds no conversation state"""
+    return openai.OpenAI(api_key=api_key)
 
 def initialize_chatbot():
-    """Initialize the chatbot with API key"""
+    """
+    Initialize the chatbot with API key. Each browser session gets its own chatbot,
+    since it holds that session's chat history and cached replies; the sales data
+    and the OpenAI client behind it are shared.
+    """
     api_key = st.session_state.get('api_key', '') or os.getenv('OPENAI_API_KEY')
     if not api_key:
         return None
+    chatbot = st.session_state.get('chatbot')
+    if chatbot is not None and st.session_state.get('chatbot_api_key') == api_key:
+        return chatbot
     try:
-        return SalesPredictionChatbot(api_key)
+        chatbot = SalesPredictionChatbot(api_key, client=_get_client(api_key))
     except Exception as e:
         st.error(f"Error initializing chatbot: {e}")
         return None
+    st.session_state['chatbot'] = chatbot
+    st.session_state['chatbot_api_key'] = api_key
+    return chatbot
 
 def main():
     """Main Streamlit application with custom UI"""
@@ -181,22 +156,16 @@ def main():
             st.session_state['api_key'] = api_key
         st.markdown("---")
         st.markdown("### 📖 Help")
-        st.info("""
-**I can help you with:**
-
-🔮 **Sales Predictions:**
-- 'Predict sales for item 3 on 2024-05-01'
-- 'Sales for item 2 on 4-5-2024'
-
-
-
-🏆 **Top Performers:**
-- 'Most sold item in May 2024'
-
-**Date formats:** YYYY-MM-DD, DD-MM-YYYY, 'whole May', etc.
-        """)
+        st.info(HELP_MD)
         if st.button("🗑️ Clear Chat History"):
             st.session_state['messages'] = []
+            st.session_state['show_full_history'] = False
+            # Stop a reply that is still being generated; the worker's result is dropped
+            pending = st.session_state.pop('pending_reply', None)
+            if pending is not None:
+                pending["cancel"].set()
+            # The session's chatbot remembers the conversation too, so start a fresh one
+            st.session_state.pop('chatbot', None)
             st.rerun()
 
     # --- Main Page UI ---
@@ -211,6 +180,15 @@ def main():
 
     # Chat container below the header
     st.markdown('<div class="chat-wrapper">', unsafe_allow_html=True)
+    
+    chatbot = initialize_chatbot()
+    chat_panel(chatbot)
+    
+    st.markdown('</div>', unsafe_allow_html=True) # Close chat-wrapper
+
+@st.fragment
+def chat_panel(chatbot):
+    """Chat history and input; sending a message reruns only this fragment, not the whole page"""
 
     # Chat History Container
     with st.container():
@@ -218,43 +196,47 @@ def main():
         
         # Initialize chat history
         if 'messages' not in st.session_state:
-            st.session_state['messages'] = [{"role": "bot", "content": "Hello! I'm your AI Sales Agent. I can help you with sales predictions, analyze historical data, and find top-performing items. What would you like to know?"}]
-
-        # Display chat messages from history
-        for message in st.session_state.messages:
-            if message["role"] == "user":
-                st.markdown(f'<div class="chat-message user-message"><div class="chat-bubble user-bubble">{message["content"]}</div></div>', unsafe_allow_html=True)
-            elif message["role"] == "bot":
-                st.markdown(f'<div class="chat-message bot-message"><div class="chat-bubble bot-bubble">{message["content"]}</div></div>', unsafe_allow_html=True)
+            st.session_state['messages'] = [make_message("bot", "Hello! I'm your AI Sales Agent. I can help you with sales predictions, analyze historical data, and find top-performing items. What would you like to know?")]
+
+        # Render a window of recent messages, so the page doesn't grow with every turn.
+        # Collapsed expanders still run their contents, so older messages sit behind a button.
+        messages = st.session_state.messages
+        hidden = len(messages) - HISTORY_WINDOW
+        if hidden > 0 and not st.session_state.get('show_full_history'):
+            if st.button(f"▲ Show {hidden} earlier messages"):
+                st.session_state['show_full_history'] = True
+            else:
+                messages = messages[-HISTORY_WINDOW:]
+
+        # Display chat messages from history as one block, so the browser gets a single update
+        bubbles = [message["html"] for message in messages if message["role"] in ("user", "bot")]
+        if bubbles:
+            st.markdown("\n".join(bubbles), unsafe_allow_html=True)
 
         st.markdown('</div>', unsafe_allow_html=True)
 
     # --- Input Section ---
     st.markdown('<div class="input-section">', unsafe_allow_html=True)
     
-    chatbot = initialize_chatbot()
     if not chatbot:
         st.warning("Please enter your OpenAI API key in the sidebar to begin.")
     else:
+        # A reply still being generated when this run started (e.g. after a Cancel click)
+        if 'pending_reply' in st.session_state:
+            await_reply(st.session_state['pending_reply'])
+        
         # Use st.chat_input for a cleaner chat interface
         if user_input := st.chat_input("Ask for sales predictions, analysis, or find top performers..."):
-            # Add user message to session state
-            st.session_state.messages.append({"role": "user", "content": user_input})
-            
-            # Get bot response
-            with st.spinner("🤖 Thinking..."):
-                try:
-                    bot_response = chatbot.handle_query(user_input)
-                    st.session_state.messages.append({"role": "bot", "content": bot_response})
-                except Exception as e:
-                    error_message = f"Sorry, an error occurred: {e}"
-                    st.session_state.messages.append({"role": "bot", "content": error_message})
+            # Add user message to session state and show it right away
+            message = make_message("user", user_input)
+            st.session_state.messages.append(message)
+            st.markdown(message["html"], unsafe_allow_html=True)
             
-            # Rerun to update the chat display
-            st.rerun()
+            # The reply is generated on a worker thread and streamed into its bubble.
+            # The fragment is already up to date afterwards, so no rerun is needed.
+            await_reply(start_reply(chatbot, user_input))
 
     st.markdown('</div>', unsafe_allow_html=True) # Close input-section
-    st.markdown('</div>', unsafe_allow_html=True) # Close chat-wrapper
 
 if __name__ == "__main__":
     main()
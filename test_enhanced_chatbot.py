@@ -7,21 +7,26 @@ This script demonstrates the new capabilities including:
 - Sales analysis and summaries
 """
 
+import asyncio
 import os
-from sales_chatbot import SalesPredictionChatbot
+import sys
+from sales_chatbot import SalesPredictionChatbot, configure_logging
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-def test_chatbot():
-    """Test the enhanced chatbot functionality"""
+async def run_test_queries(batch=False, packed=False):
+    """
+    Run the enhanced chatbot test queries, optionally through the OpenAI Batch API or packed
+    requests. Returns True if every query was answered and the repeated-query check passed.
+    """
     
     # Initialize chatbot (you'll need to set your OpenAI API key)
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
         print("❌ Please set your OPENAI_API_KEY in the .env file")
-        return
+        return False
     
     try:
         chatbot = SalesPredictionChatbot(api_key)
@@ -36,22 +41,91 @@ def test_chatbot():
             "What item sold the most in May 2024?"
         ]
         
-        for i, query in enumerate(test_queries, 1):
+        if batch:
+            # One Batch API job at half the cost; it can take a while to finish
+            print("⏳ Submitted as a batch job, waiting for the results...")
+            try:
+                responses = await asyncio.to_thread(chatbot.run_batch, test_queries)
+            except Exception as e:
+                responses = [e] * len(test_queries)
+        elif packed:
+            # All queries share one extraction request and one response request
+            try:
+                responses = await asyncio.to_thread(chatbot.handle_queries, test_queries, True)
+            except Exception as e:
+                responses = [e] * len(test_queries)
+        else:
+            # The queries are independent, so send them all at once instead of one after another
+            responses = await asyncio.gather(*(chatbot.ahandle_query(query) for query in test_queries),
+                                             return_exceptions=True)
+        
+        failures = 0
+        for i, (query, response) in enumerate(zip(test_queries, responses), 1):
             print(f"\n📝 Test {i}: {query}")
             print("-" * 40)
             
-            try:
-                response = chatbot.handle_query(query)
+            if isinstance(response, Exception):
+                failures += 1
+                print(f"❌ Error: {response}")
+            else:
                 print(f"🤖 Response:\n{response}")
-            except Exception as e:
-                print(f"❌ Error: {e}")
             
             print()
         
+        if not check_repeated_query(chatbot):
+            failures += 1
+        
+        if failures:
+            print(f"💥 {failures} check(s) failed!")
+            return False
         print("✅ Test completed!")
+        return True
         
     except Exception as e:
         print(f"❌ Error initializing chatbot: {e}")
+        return False
+
+def check_repeated_query(chatbot):
+    """
+    Check that a repeated query is answered from the caches without any OpenAI call.
+    Extraction is keyed on the query and the exchange before it, so the query is asked
+    twice first; the third time it follows the same exchange as the second.
+    Returns True if the check passed.
+    """
+    query = "Give me a sales summary for item 2 in June 2024"
+    
+    # Count the chat completion requests made through this chatbot's client
+    completions = chatbot.client.chat.completions
+    create = completions.create
+    calls = []
+    completions.create = lambda **kwargs: calls.append(kwargs) or create(**kwargs)
+    try:
+        chatbot.handle_query(query)
+        chatbot.handle_query(query)
+        warmup_calls = len(calls)
+        chatbot.handle_query(query)
+        repeat_calls = len(calls) - warmup_calls
+    finally:
+        del completions.create
+    
+    print(f"\n📝 Repeated query: {query}")
+    print("-" * 40)
+    if repeat_calls == 0:
+        print(f"✅ Answered from the cache ({warmup_calls} API call(s) before, none on the repeat)")
+    else:
+        print(f"❌ Repeating the query made {repeat_calls} more API call(s)")
+    print()
+    return repeat_calls == 0
 
 if __name__ == "__main__":
-    test_chatbot()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the enhanced sales chatbot test queries.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--batch", action="store_true", help="Send the queries through the OpenAI Batch API (cheaper, slower).")
+    mode.add_argument("--packed", action="store_true", help="Pack the queries into one extraction and one response request.")
+    
+    args = parser.parse_args()
+    configure_logging()
+    success = asyncio.run(run_test_queries(batch=args.batch, packed=args.packed))
+    sys.exit(0 if success else 1)